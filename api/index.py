@@ -9,12 +9,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import settings
 from app.database import connect_to_mongo, close_mongo_connection
+from app.warmup import start_prewarm
 from app.routers import auth, artists, requests
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     connect_to_mongo()
+    start_prewarm()
     yield
     # Shutdown
     close_mongo_connection()
@@ -0,0 +1,152 @@
+import asyncio
+from collections import deque
+from typing import Dict, Optional
+from fastapi.responses import JSONResponse
+from app.auth import is_valid_token
+from app.config import settings
+
+# Request classes, highest priority first
+ARTIST = "artist"
+PUBLIC = "public"
+SEARCH = "search"
+PRIORITY = [ARTIST, PUBLIC, SEARCH]
+
+# Probes must never queue or be shed
+EXEMPT_PATHS = {"/", "/health", "/ready"}
+
+
+class Shed(Exception):
+    """Raised when a request is turned away instead of queued"""
+
+
+def classify(scope) -> Optional[str]:
+    """The admission class of a request, or None if it bypasses admission control"""
+    path = scope["path"]
+    if path in EXEMPT_PATHS:
+        return None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            # A forged header must not buy priority, so the token is verified
+            if scheme.lower() == "bearer" and is_valid_token(token):
+                return ARTIST
+            break
+    if path.startswith("/api/spotify/") or (path.startswith("/api/catalog/") and path.endswith("/search")):
+        return SEARCH
+    return PUBLIC
+
+
+class AdmissionController:
+    """
+    Per-class concurrency limits with bounded, priority-ordered wait queues
+
+    At most ADMISSION_MAX_CONCURRENCY requests run at once. Public reads
+    and Spotify search are capped below that total, so the rest is always
+    left for authenticated artist requests. When a slot frees up, waiting
+    artist requests are admitted first, then public, then search. Low
+    priority requests that find their queue full, or wait longer than
+    ADMISSION_MAX_WAIT_SECONDS, are shed.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[str, int] = {name: 0 for name in PRIORITY}
+        self.shed: Dict[str, int] = {name: 0 for name in PRIORITY}
+        self._waiters: Dict[str, deque] = {name: deque() for name in PRIORITY}
+
+    @staticmethod
+    def _limit(request_class: str) -> int:
+        if request_class == PUBLIC:
+            return settings.ADMISSION_PUBLIC_CONCURRENCY
+        if request_class == SEARCH:
+            return settings.ADMISSION_SEARCH_CONCURRENCY
+        return settings.ADMISSION_MAX_CONCURRENCY
+
+    def _can_admit(self, request_class: str) -> bool:
+        return (
+            sum(self.in_flight.values()) < settings.ADMISSION_MAX_CONCURRENCY
+            and self.in_flight[request_class] < self._limit(request_class)
+        )
+
+    async def acquire(self, request_class: str):
+        if self._can_admit(request_class) and not self._waiters[request_class]:
+            self.in_flight[request_class] += 1
+            return
+        waiters = self._waiters[request_class]
+        if request_class != ARTIST and len(waiters) >= settings.ADMISSION_QUEUE_SIZE:
+            self.shed[request_class] += 1
+            raise Shed()
+
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        timeout = None if request_class == ARTIST else settings.ADMISSION_MAX_WAIT_SECONDS
+        try:
+            # The slot is counted for us by release() before the future resolves
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Admitted at the same moment the wait timed out
+                return
+            waiters.remove(waiter)
+            waiter.cancel()
+            self.shed[request_class] += 1
+            raise Shed()
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot if we were handed one
+            if waiter.done() and not waiter.cancelled():
+                self.release(request_class)
+            elif waiter in waiters:
+                waiters.remove(waiter)
+            raise
+
+    def release(self, request_class: str):
+        self.in_flight[request_class] -= 1
+        # Hand freed capacity to the highest-priority waiters first
+        for name in PRIORITY:
+            waiters = self._waiters[name]
+            while waiters and self._can_admit(name):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.in_flight[name] += 1
+                    waiter.set_result(None)
+
+    def snapshot(self) -> Dict:
+        return {
+            name: {
+                "in_flight": self.in_flight[name],
+                "queued": len(self._waiters[name]),
+                "shed": self.shed[name],
+            }
+            for name in PRIORITY
+        }
+
+
+class AdmissionMiddleware:
+    """Queues or sheds requests according to their admission class"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        request_class = classify(scope) if scope["type"] == "http" else None
+        if request_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await admission_controller.acquire(request_class)
+        except Shed:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy, please retry shortly"},
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_controller.release(request_class)
+
+
+# Global instance
+admission_controller = AdmissionController()
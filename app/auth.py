@@ -1,29 +1,66 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Dict, List, Optional
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from app.config import settings
-from app.database import get_database
+from app.database import get_database, get_public_database
 from app.models.artist import Artist, TokenData
+from app.services.cache import cache
+from app.services.loader import BatchLoader
+from app.timing import phase
 
-# Password hashing - using argon2 instead of bcrypt for better compatibility
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# The artist fields lookups need. Credentials and email are never read through
+# the loaders, so they never reach the cache or its shared Redis tier
+ARTIST_LOOKUP_FIELDS = {
+    "username": 1, "display_name": 1, "bio": 1, "is_active": 1,
+    "queue_order": 1, "created_at": 1, "updated_at": 1,
+}
+
+# Artist documents by username, looked up on every authenticated request
+artist_cache = cache.namespace("artists", ttl=settings.ARTIST_CACHE_TTL_SECONDS)
+# Artist documents read from secondaries for audience-facing routes, kept apart
+# so a lagging read never ends up in the cache artist-facing routes use
+public_artist_cache = cache.namespace("public_artists", ttl=settings.ARTIST_CACHE_TTL_SECONDS)
+
+def _find_artists(db, usernames: List[str]) -> Dict[str, dict]:
+    """Artist documents for several usernames in one query"""
+    found = {}
+    for artist_data in db.artists.find({"username": {"$in": usernames}}, ARTIST_LOOKUP_FIELDS):
+        # Convert ObjectId to string for Pydantic compatibility
+        artist_data["_id"] = str(artist_data["_id"])
+        found[artist_data["username"]] = artist_data
+    return found
+
+# Concurrent lookups of the same artists share one query
+artist_loader = BatchLoader(lambda usernames: _find_artists(get_database(), usernames))
+public_artist_loader = BatchLoader(lambda usernames: _find_artists(get_public_database(), usernames))
+
+# Password hashing - using argon2 instead of bcrypt for better compatibility.
+# passlib/argon2 and jose are imported on first use to keep cold starts fast.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Get the password hashing context, creating it on first use"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["argon2"], deprecated="auto")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    with phase("hash"):
+        return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    with phase("hash"):
+        return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
+    from jose import jwt
+    
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -34,27 +71,59 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def is_valid_token(token: str) -> bool:
+    """Check a JWT's signature and expiry without touching the database"""
+    from jose import JWTError, jwt
+    
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return False
+    return payload.get("sub") is not None
+
+async def get_artist_data(username: str, public: bool = False) -> Optional[dict]:
+    """
+    Get an artist document by username, through the artist cache; callers must not modify it
+
+    Public lookups tolerate replication lag and may be served by a
+    secondary, as the audience-facing routes always were.
+    """
+    cache_namespace, loader = (public_artist_cache, public_artist_loader) if public else (artist_cache, artist_loader)
+    artist_data, _ = cache_namespace.get(username)
+    if artist_data is None:
+        artist_data = await loader.load(username)
+        if artist_data is None:
+            return None
+        cache_namespace.set(username, artist_data)
+    return artist_data
+
+def invalidate_artist(username: str):
+    """Drop an artist from both artist caches, on every instance"""
+    artist_cache.invalidate(username)
+    public_artist_cache.invalidate(username)
+
 async def get_artist_by_username(username: str) -> Optional[Artist]:
     """Get artist by username from database"""
-    db = get_database()
-    artist_data = db.artists.find_one({"username": username})
+    artist_data = await get_artist_data(username)
     if artist_data:
-        # Convert ObjectId to string for Pydantic compatibility
-        artist_data["_id"] = str(artist_data["_id"])
         return Artist(**artist_data)
     return None
 
 async def authenticate_artist(username: str, password: str) -> Optional[Artist]:
     """Authenticate an artist with username and password"""
-    artist = await get_artist_by_username(username)
-    if not artist:
+    # Read from MongoDB: password hashes are never cached
+    artist_data = get_database().artists.find_one({"username": username})
+    if not artist_data:
         return None
-    if not verify_password(password, artist.password_hash):
+    if not verify_password(password, artist_data["password_hash"]):
         return None
-    return artist
+    artist_data["_id"] = str(artist_data["_id"])
+    return Artist(**artist_data)
 
 async def get_current_artist(token: str = Depends(oauth2_scheme)) -> Artist:
     """Get current authenticated artist from JWT token"""
+    from jose import JWTError, jwt
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
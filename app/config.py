@@ -7,6 +7,13 @@ class Settings:
     # MongoDB settings
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "requestr")
+    # Connection pool size per worker process
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+    # Read routing for public, staleness-tolerant reads
+    # (MongoDB requires maxStalenessSeconds to be at least 90)
+    PUBLIC_READ_PREFERENCE: str = os.getenv("PUBLIC_READ_PREFERENCE", "primary")
+    PUBLIC_READ_MAX_STALENESS_SECONDS: int = int(os.getenv("PUBLIC_READ_MAX_STALENESS_SECONDS", "90"))
     
     # JWT settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -33,9 +40,92 @@ class Settings:
             origins.append(frontend_url)
         return origins
     
+    # Song catalog settings
+    CATALOG_TTL_SECONDS: int = int(os.getenv("CATALOG_TTL_SECONDS", "300"))
+    CATALOG_FUZZY_THRESHOLD: float = float(os.getenv("CATALOG_FUZZY_THRESHOLD", "0.5"))
+    
+    # Spotify upstream settings
+    SPOTIFY_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT_SECONDS", "2"))
+    SPOTIFY_TIMEOUT_SECONDS: float = float(os.getenv("SPOTIFY_TIMEOUT_SECONDS", "5"))
+    SPOTIFY_SEARCH_CACHE_TTL_SECONDS: int = int(os.getenv("SPOTIFY_SEARCH_CACHE_TTL_SECONDS", "600"))
+    SPOTIFY_STALE_TTL_SECONDS: int = int(os.getenv("SPOTIFY_STALE_TTL_SECONDS", "86400"))
+    SPOTIFY_CACHE_MAX_ENTRIES: int = int(os.getenv("SPOTIFY_CACHE_MAX_ENTRIES", "1000"))
+    SPOTIFY_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("SPOTIFY_BREAKER_FAILURE_THRESHOLD", "5"))
+    SPOTIFY_BREAKER_RESET_SECONDS: float = float(os.getenv("SPOTIFY_BREAKER_RESET_SECONDS", "30"))
+    
+    # Background track enrichment for new requests
+    ENRICHMENT_BATCH_SIZE: int = int(os.getenv("ENRICHMENT_BATCH_SIZE", "50"))
+    ENRICHMENT_BATCH_WAIT_SECONDS: float = float(os.getenv("ENRICHMENT_BATCH_WAIT_SECONDS", "0.5"))
+    ENRICHMENT_QUEUE_SIZE: int = int(os.getenv("ENRICHMENT_QUEUE_SIZE", "1000"))
+    ENRICHMENT_MAX_ATTEMPTS: int = int(os.getenv("ENRICHMENT_MAX_ATTEMPTS", "5"))
+    
+    # Pending queue snapshot settings
+    QUEUE_SNAPSHOT_TTL_SECONDS: float = float(os.getenv("QUEUE_SNAPSHOT_TTL_SECONDS", "2"))
+    QUEUE_SNAPSHOT_MAX_ARTISTS: int = int(os.getenv("QUEUE_SNAPSHOT_MAX_ARTISTS", "1000"))
+    QUEUE_CHANGE_LOG_SIZE: int = int(os.getenv("QUEUE_CHANGE_LOG_SIZE", "200"))
+    
+    # Queue position storage: "mongo", or "redis" to keep live positions in a sorted set
+    QUEUE_BACKEND: str = os.getenv("QUEUE_BACKEND", "mongo")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    QUEUE_PERSIST_INTERVAL_SECONDS: float = float(os.getenv("QUEUE_PERSIST_INTERVAL_SECONDS", "0.5"))
+    
+    # History export settings
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+    
+    # Two-tier cache: in-process entries per namespace, plus Redis shared between instances when set
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "")
+    CACHE_L2_TIMEOUT_SECONDS: float = float(os.getenv("CACHE_L2_TIMEOUT_SECONDS", "0.1"))
+    CACHE_L2_RETRY_SECONDS: float = float(os.getenv("CACHE_L2_RETRY_SECONDS", "5"))
+    ARTIST_CACHE_TTL_SECONDS: float = float(os.getenv("ARTIST_CACHE_TTL_SECONDS", "30"))
+    TRACK_MEMORY_CACHE_TTL_SECONDS: float = float(os.getenv("TRACK_MEMORY_CACHE_TTL_SECONDS", "3600"))
+    
+    # Track metadata cache settings
+    TRACK_CACHE_TTL_SECONDS: int = int(os.getenv("TRACK_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
+    # Readiness probe settings
+    READINESS_TIMEOUT_SECONDS: float = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))
+    READINESS_MAX_LOOP_LAG_MS: float = float(os.getenv("READINESS_MAX_LOOP_LAG_MS", "500"))
+    
+    # Admission control (per worker process). Public reads and Spotify
+    # search get capped shares of the total so artists always have headroom.
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "24"))
+    ADMISSION_PUBLIC_CONCURRENCY: int = int(os.getenv("ADMISSION_PUBLIC_CONCURRENCY", "16"))
+    ADMISSION_SEARCH_CONCURRENCY: int = int(os.getenv("ADMISSION_SEARCH_CONCURRENCY", "4"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+    ADMISSION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "1"))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+    
+    # Request timing settings
+    SERVER_TIMING_HEADER: bool = os.getenv("SERVER_TIMING_HEADER", "true").lower() == "true"
+    SLOW_REQUEST_THRESHOLD_MS: float = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "500"))
+    
+    # Per-request latency budgets (0 disables); become MongoDB maxTimeMS and Spotify timeouts
+    DEADLINE_DEFAULT_MS: int = int(os.getenv("DEADLINE_DEFAULT_MS", "5000"))
+    DEADLINE_SEARCH_MS: int = int(os.getenv("DEADLINE_SEARCH_MS", "4000"))
+    DEADLINE_EXPORT_MS: int = int(os.getenv("DEADLINE_EXPORT_MS", "0"))
+    
+    # On-demand profiling: requests sending PROFILE_TOKEN in X-Profile-Token, plus a random sample
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "/tmp/requestr-profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    
+    # Response compression: gzip bodies of at least GZIP_MINIMUM_SIZE bytes for clients that accept it
+    GZIP_MINIMUM_SIZE: int = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+    GZIP_COMPRESSLEVEL: int = int(os.getenv("GZIP_COMPRESSLEVEL", "5"))
+    
     # Production settings
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     
+    # Server settings (used by app.server)
+    HOST: str = os.getenv("HOST", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    KEEP_ALIVE_SECONDS: int = int(os.getenv("KEEP_ALIVE_SECONDS", "5"))
+    GRACEFUL_SHUTDOWN_SECONDS: int = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "20"))
+    
     @property
     def is_production(self) -> bool:
         return self.ENVIRONMENT == "production"
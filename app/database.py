@@ -1,18 +1,55 @@
 from pymongo import MongoClient
 from pymongo.database import Database
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 from app.config import settings
+from app.monitoring import pool_monitor
+from app.timing import command_timer
 
 class MongoDB:
     client: MongoClient = None
     database: Database = None
+    # Same database, routed by PUBLIC_READ_PREFERENCE for staleness-tolerant reads
+    public_database: Database = None
 
 mongodb = MongoDB()
 
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def _public_read_preference():
+    """Build the read preference used for public, staleness-tolerant reads"""
+    mode = settings.PUBLIC_READ_PREFERENCE
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown PUBLIC_READ_PREFERENCE: {mode}")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=settings.PUBLIC_READ_MAX_STALENESS_SECONDS)
+
 def connect_to_mongo():
-    """Create database connection"""
-    mongodb.client = MongoClient(settings.MONGODB_URL)
+    """Create database connection
+
+    MongoClient connects lazily, so this does not block on the network;
+    call ensure_indexes() (see app.warmup) to create indexes.
+    """
+    # Called from the app lifespan, so each worker process gets its own client
+    mongodb.client = MongoClient(
+        settings.MONGODB_URL,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        event_listeners=[pool_monitor, command_timer]
+    )
     mongodb.database = mongodb.client[settings.DATABASE_NAME]
-    
+    mongodb.public_database = mongodb.client.get_database(
+        settings.DATABASE_NAME, read_preference=_public_read_preference()
+    )
+
+def ensure_indexes():
+    """Create indexes; blocks on the first round trips to MongoDB"""
     # Create indexes for better performance
     # Index on artist username for faster lookups
     mongodb.database.artists.create_index("username", unique=True)
@@ -20,8 +57,25 @@ def connect_to_mongo():
     
     # Index on requests for faster queries
     mongodb.database.requests.create_index([("artist_username", 1), ("queue_position", 1)])
-    mongodb.database.requests.create_index([("artist_username", 1), ("status", 1)])
+    # Status-filtered queue reads, sorted by position without an in-memory sort
+    mongodb.database.requests.create_index([("artist_username", 1), ("status", 1), ("queue_position", 1)])
     mongodb.database.requests.create_index("created_at")
+    # History search: text search and date-range browsing within one artist
+    mongodb.database.requests.create_index(
+        [("artist_username", 1), ("song_title", "text"), ("song_artist", "text"), ("requester_name", "text")],
+        name="history_text"
+    )
+    mongodb.database.requests.create_index([("artist_username", 1), ("created_at", -1), ("_id", -1)])
+    mongodb.database.requests.create_index(
+        [("artist_username", 1), ("status", 1), ("created_at", -1), ("_id", -1)]
+    )
+    # Tip-ordered pending queue: read in index order, no in-memory sort
+    mongodb.database.requests.create_index(
+        [("artist_username", 1), ("status", 1), ("tip_amount", -1), ("created_at", 1)]
+    )
+    
+    # Index on curated repertoire for catalog builds
+    mongodb.database.repertoire.create_index("artist_username")
 
 def close_mongo_connection():
     """Close database connection"""
@@ -30,4 +84,14 @@ def close_mongo_connection():
 
 def get_database() -> Database:
     """Get database instance"""
-    return mongodb.database
\ No newline at end of file
+    return mongodb.database
+
+def get_public_database() -> Database:
+    """
+    Get database instance for public reads that tolerate replication lag
+
+    Audience-facing reads (queue views, artist profiles) go through this
+    handle so they can be served by secondaries. Anything that reads its
+    own writes, such as artist-facing routes, must use get_database().
+    """
+    return mongodb.public_database
\ No newline at end of file
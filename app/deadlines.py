@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple, Union
+import pymongo
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from pymongo.errors import ConnectionFailure, PyMongoError, ServerSelectionTimeoutError
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Probes and debug endpoints have no budget; the readiness probe has its own timeout
+EXEMPT_PATHS = {"/", "/health", "/ready"}
+
+Timeout = Union[None, float, Tuple[Optional[float], Optional[float]]]
+
+# maxTimeMS is the time left minus the round-trip time, so the server gives up just before the deadline
+EXPIRY_SLACK_SECONDS = 0.05
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# The request's ASGI scope, so timeouts can be attributed to its endpoint
+_scope: ContextVar[Optional[Dict]] = ContextVar("request_deadline_scope", default=None)
+
+
+class DeadlineMetrics:
+    """Requests that ran out of budget, by what was running when it ran out"""
+
+    def __init__(self):
+        self.timeouts: Dict[str, int] = {"mongo": 0, "spotify": 0, "handler": 0}
+        self.by_route: Dict[str, int] = {}
+
+    def record(self, source: str, scope: Optional[Dict] = None):
+        self.timeouts[source] += 1
+        endpoint = scope.get("endpoint") if scope else None
+        route = getattr(endpoint, "__name__", None) or (scope or {}).get("path", "unknown")
+        self.by_route[route] = self.by_route.get(route, 0) + 1
+
+    def snapshot(self) -> Dict:
+        return {"timeouts": dict(self.timeouts), "by_route": dict(self.by_route)}
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised instead of starting work the request no longer has time for"""
+
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Request deadline exceeded")
+
+
+def budget_for(scope) -> Optional[float]:
+    """The latency budget in seconds for a request, or None if it has none"""
+    path = scope["path"]
+    if path in EXEMPT_PATHS or path.startswith("/debug/"):
+        return None
+    if path.endswith("/export"):
+        milliseconds = settings.DEADLINE_EXPORT_MS
+    elif path.startswith("/api/spotify/") or (path.startswith("/api/catalog/") and path.endswith("/search")):
+        milliseconds = settings.DEADLINE_SEARCH_MS
+    else:
+        milliseconds = settings.DEADLINE_DEFAULT_MS
+    return milliseconds / 1000 if milliseconds > 0 else None
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a budgeted request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(source: str):
+    """Raise DeadlineExceeded if the current request is out of time"""
+    if expired():
+        deadline_metrics.record(source, _scope.get())
+        raise DeadlineExceeded()
+
+
+def clamp_timeout(timeout: Timeout, source: str) -> Timeout:
+    """Shorten a requests-style timeout, a number or (connect, read), to the time left"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        deadline_metrics.record(source, _scope.get())
+        raise DeadlineExceeded()
+    if isinstance(timeout, tuple):
+        return tuple(left if part is None else min(part, left) for part in timeout)
+    return left if timeout is None else min(timeout, left)
+
+
+async def mongo_timeout_handler(request: Request, exc: PyMongoError):
+    """
+    Turn MongoDB operations cut off by the request budget (maxTimeMS) into 504s
+
+    Only a timeout that came as the request's own budget ran out counts as
+    a deadline overrun. Failing to reach a server, or a timeout while
+    budget is left, means MongoDB is unavailable and gets a 503.
+    """
+    left = remaining()
+    if (
+        exc.timeout
+        and not isinstance(exc, ServerSelectionTimeoutError)
+        and left is not None
+        and left <= EXPIRY_SLACK_SECONDS
+    ):
+        deadline_metrics.record("mongo", request.scope)
+        return JSONResponse(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            content={"detail": "Request deadline exceeded"}
+        )
+    if exc.timeout or isinstance(exc, ConnectionFailure):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Database unavailable"}
+        )
+    raise exc
+
+
+class DeadlineMiddleware:
+    """
+    Gives each request a latency budget and enforces it end to end
+
+    The budget (DEADLINE_*_MS by route) becomes a deadline that downstream
+    code reads through `remaining()`. Every MongoDB operation runs under
+    `pymongo.timeout`, which sends the time left as maxTimeMS and bounds
+    server selection and socket waits; Spotify calls shorten their connect
+    and read timeouts to it. When the deadline passes the handler is
+    cancelled and, if nothing was sent yet, the client gets a 504.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        budget = budget_for(scope) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + budget)
+        scope_token = _scope.set(scope)
+        response_started = False
+
+        async def send_tracking_start(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            with pymongo.timeout(budget):
+                # wait_for runs the app in a task that copies the context set above
+                await asyncio.wait_for(self.app(scope, receive, send_tracking_start), budget)
+        except asyncio.TimeoutError:
+            deadline_metrics.record("handler", scope)
+            if response_started:
+                logger.warning("Deadline exceeded mid-response for %s %s", scope["method"], scope["path"])
+                return
+            response = JSONResponse(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                content={"detail": "Request deadline exceeded"}
+            )
+            await response(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+            _scope.reset(scope_token)
+
+
+# Global instance
+deadline_metrics = DeadlineMetrics()
@@ -1,25 +1,65 @@
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response, status
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
+from pymongo.errors import PyMongoError
 from app.config import settings
-from app.database import connect_to_mongo, close_mongo_connection
-from app.routers import auth, artists, requests, spotify
+from app.database import connect_to_mongo, close_mongo_connection, get_database
+from app.monitoring import loop_lag_monitor, readiness_report
+from app.timing import ServerTimingMiddleware, TimedJSONResponse
+from app.profiling import ProfilingMiddleware, profile_store, token_matches
+from app.deadlines import DeadlineMiddleware, deadline_metrics, mongo_timeout_handler
+from app.admission import AdmissionMiddleware, admission_controller
+from app.services.spotify import get_spotify_service
+from app.warmup import indexes_ready, start_prewarm, stop_prewarm
+from app.services.queue_snapshot import queue_snapshots
+from app.services.enrichment import enrichment_worker
+from app.services.queue_store import get_queue_store
+from app.services.cache import cache
+from app.routers import auth, artists, requests, spotify, catalog
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     connect_to_mongo()
+    cache.start()
+    start_prewarm()
+    loop_lag_monitor.start()
+    queue_snapshots.start()
+    enrichment_worker.start()
+    get_queue_store().start()
     yield
     # Shutdown
+    get_queue_store().stop()
+    enrichment_worker.stop()
+    queue_snapshots.stop()
+    loop_lag_monitor.stop()
+    stop_prewarm()
+    cache.stop()
     close_mongo_connection()
 
 app = FastAPI(
     title="Requestr API",
     description="Live musician song request application",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
 )
 
+# On-demand stack-sampling profiles, innermost so they cover only the route
+app.add_middleware(ProfilingMiddleware)
+# Compress large bodies (queues, history pages, exports); inside timing so it counts toward total
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE, compresslevel=settings.GZIP_COMPRESSLEVEL)
+# Per-phase Server-Timing header and slow-request log
+app.add_middleware(ServerTimingMiddleware)
+# Priority-aware admission control; added before CORS so shed responses still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+# Per-route latency budgets; outside admission so time spent queued counts against them
+app.add_middleware(DeadlineMiddleware)
+app.add_exception_handler(PyMongoError, mongo_timeout_handler)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +78,7 @@ app.include_router(auth.router, prefix="/api")
 app.include_router(artists.router, prefix="/api")
 app.include_router(requests.router, prefix="/api")
 app.include_router(spotify.router, prefix="/api")
+app.include_router(catalog.router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -47,6 +88,29 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: pings MongoDB and reports pool, Spotify token, event-loop lag, enrichment backlog, admission queues, cache hit rates and deadline timeouts"""
+    try:
+        spotify_service = get_spotify_service()
+    except ValueError:
+        # Spotify credentials are not configured
+        spotify_service = None
+    report = await readiness_report(get_database(), spotify_service)
+    # Until the unique indexes exist, registration could create duplicate artists
+    report["mongo"]["indexes_ready"] = indexes_ready.is_set()
+    if not indexes_ready.is_set():
+        report["ready"] = False
+        report["status"] = "unavailable"
+    # Informational: a backlog delays artwork but does not make the API unready
+    report["enrichment"] = enrichment_worker.snapshot()
+    report["admission"] = admission_controller.snapshot()
+    report["cache"] = cache.snapshot()
+    report["deadlines"] = deadline_metrics.snapshot()
+    if not report["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
+
 @app.get("/debug/routes")
 async def debug_routes():
     """Debug endpoint to show all registered routes"""
@@ -57,4 +121,26 @@ async def debug_routes():
                 "path": route.path,
                 "methods": list(route.methods) if route.methods else []
             })
-    return {"routes": routes}
\ No newline at end of file
+    return {"routes": routes}
+
+def _check_profile_token(token: Optional[str]):
+    """Profiles are only served to holders of PROFILE_TOKEN; without one the endpoints do not exist"""
+    if not settings.PROFILE_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not token_matches(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profile token")
+
+@app.get("/debug/profiles")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    """List stored request profiles, newest first (requires X-Profile-Token)"""
+    _check_profile_token(x_profile_token)
+    return {"profiles": profile_store.list()}
+
+@app.get("/debug/profiles/{name}")
+async def download_profile(name: str, x_profile_token: Optional[str] = Header(None)):
+    """Download a profile as folded stacks, for flamegraph.pl or speedscope (requires X-Profile-Token)"""
+    _check_profile_token(x_profile_token)
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
\ No newline at end of file
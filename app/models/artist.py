@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from datetime import datetime
+from enum import Enum
 from bson import ObjectId
 
 class PyObjectId(ObjectId):
@@ -18,14 +19,20 @@ class PyObjectId(ObjectId):
     def __get_pydantic_json_schema__(cls, _core_schema, handler):
         return {"type": "string"}
 
+class QueueOrder(str, Enum):
+    POSITION = "position"  # manual order by queue_position
+    TIPS = "tips"          # highest tip first, then oldest first
+
 class Artist(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     username: str = Field(..., min_length=3, max_length=30)
     display_name: str = Field(..., min_length=1, max_length=100)
-    email: EmailStr
-    password_hash: str
+    # Unset on artists loaded for a request: lookups never read credentials or email
+    email: Optional[EmailStr] = None
+    password_hash: Optional[str] = None
     bio: Optional[str] = Field(None, max_length=500)
     is_active: bool = True
+    queue_order: QueueOrder = QueueOrder.POSITION
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -46,6 +53,10 @@ class ArtistPublic(BaseModel):
     display_name: str
     bio: Optional[str] = None
     is_active: bool
+    queue_order: QueueOrder = QueueOrder.POSITION
+
+class QueueOrderUpdate(BaseModel):
+    queue_order: QueueOrder
 
 class ArtistLogin(BaseModel):
     username: str
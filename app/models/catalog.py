@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class RepertoireSong(BaseModel):
+    song_title: str = Field(..., min_length=1, max_length=200)
+    song_artist: str = Field(..., min_length=1, max_length=200)
+    # Spotify integration fields
+    spotify_track_id: Optional[str] = Field(None, description="Spotify track ID")
+    spotify_track_url: Optional[str] = Field(None, description="Spotify track URL")
+    album_image_url: Optional[str] = Field(None, description="Album cover image URL")
+    preview_url: Optional[str] = Field(None, description="30-second preview URL")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 from bson import ObjectId
@@ -10,6 +10,10 @@ class RequestStatus(str, Enum):
     COMPLETED = "completed"
     REJECTED = "rejected"
 
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
 class Request(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     artist_username: str = Field(..., min_length=3, max_length=30)
@@ -54,6 +58,10 @@ class RequestReorder(BaseModel):
     request_id: str
     new_position: int = Field(..., ge=1)
 
+class BulkStatusUpdate(BaseModel):
+    request_ids: List[str] = Field(..., min_length=1, max_length=500)
+    status: RequestStatus
+
 class RequestPublic(BaseModel):
     id: str
     song_title: str
@@ -71,4 +79,28 @@ class RequestPublic(BaseModel):
     preview_url: Optional[str] = None
 
     class Config:
-        json_encoders = {ObjectId: str}
\ No newline at end of file
+        json_encoders = {ObjectId: str}
+
+class QueueOperation(BaseModel):
+    op: str = Field(..., description="added, removed, status_changed, moved or updated (new track metadata)")
+    id: str
+    request: Optional[RequestPublic] = None
+    status: Optional[RequestStatus] = None
+    queue_position: Optional[int] = None
+
+class QueueDelta(BaseModel):
+    version: str
+    full: bool = Field(..., description="True when requests holds the whole queue instead of operations")
+    requests: Optional[List[RequestPublic]] = None
+    operations: List[QueueOperation] = []
+
+class RequestHistoryPage(BaseModel):
+    requests: List[RequestPublic]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page; null on the last page")
+
+class QueueAdvance(BaseModel):
+    completed: RequestPublic
+    next: Optional[RequestPublic] = None
+
+class BulkUpdateResult(BaseModel):
+    updated: int
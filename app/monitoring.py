@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from pymongo.monitoring import ConnectionPoolListener
+from app.config import settings
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """
+    Tracks MongoDB connection pool usage from pymongo pool events
+
+    pymongo keeps one pool per server, each limited to MONGO_MAX_POOL_SIZE,
+    so counts are kept per server address. `available` is the smallest
+    number of free connections left in any pool: on a replica set the
+    primary's pool can run out while the secondaries' are idle.
+    """
+
+    COUNTERS = ("open", "checked_out", "waiting", "checkout_failures")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[tuple, Dict[str, int]] = {}
+
+    def _add(self, event, **deltas):
+        with self._lock:
+            pool = self._pools.setdefault(event.address, dict.fromkeys(self.COUNTERS, 0))
+            for name, delta in deltas.items():
+                pool[name] += delta
+
+    def pool_created(self, event):
+        self._add(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        # The server left the topology; its connections are gone with it
+        with self._lock:
+            self._pools.pop(event.address, None)
+
+    def connection_created(self, event):
+        self._add(event, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(event, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(event, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(event, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(event, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(event, checked_out=-1)
+
+    def snapshot(self) -> Dict:
+        """Pool counts for this process, in total and per server"""
+        with self._lock:
+            pools = {
+                f"{host}:{port}": {
+                    **counts,
+                    "available": max(settings.MONGO_MAX_POOL_SIZE - counts["checked_out"], 0),
+                }
+                for (host, port), counts in self._pools.items()
+            }
+        return {
+            "max_size": settings.MONGO_MAX_POOL_SIZE,
+            **{name: sum(pool[name] for pool in pools.values()) for name in self.COUNTERS},
+            "available": min((pool["available"] for pool in pools.values()), default=settings.MONGO_MAX_POOL_SIZE),
+            "pools": pools,
+        }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed-interval sleep"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag_ms = max((time.perf_counter() - start - self.interval) * 1000, 0.0)
+            self.max_lag_ms = max(self.max_lag_ms, self.lag_ms)
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """Stop sampling"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        """Latest lag sample and the maximum since the last snapshot"""
+        report = {"lag_ms": round(self.lag_ms, 2), "max_lag_ms": round(self.max_lag_ms, 2)}
+        self.max_lag_ms = self.lag_ms
+        return report
+
+
+async def _ping_mongo(db) -> Dict:
+    if db is None:
+        return {"ok": False, "error": "not connected"}
+    start = time.perf_counter()
+    try:
+        # Run in a thread so a hanging server selection cannot stall the loop
+        await asyncio.wait_for(
+            asyncio.to_thread(db.command, "ping"),
+            timeout=settings.READINESS_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": "timeout"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+async def readiness_report(db, spotify_service) -> Dict:
+    """Check MongoDB and collect pool, Spotify and event-loop state"""
+    mongo = await _ping_mongo(db)
+    mongo["pool"] = pool_monitor.snapshot()
+    event_loop = loop_lag_monitor.snapshot()
+    spotify = spotify_service.token_status() if spotify_service else {"configured": False}
+
+    ready = (
+        mongo["ok"]
+        and mongo["pool"]["available"] > 0
+        and event_loop["lag_ms"] <= settings.READINESS_MAX_LOOP_LAG_MS
+    )
+    return {
+        "ready": ready,
+        "status": "ready" if ready else "unavailable",
+        "mongo": mongo,
+        "spotify": spotify,
+        "event_loop": event_loop,
+    }
+
+
+# Global instances
+pool_monitor = PoolMonitor()
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,209 @@
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from starlette.datastructures import MutableHeaders
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = b"x-profile-token"
+# Profile file names are generated here; anything else is refused for download
+PROFILE_NAME = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{6}-[A-Za-z0-9_.-]+\.folded$")
+
+
+def token_matches(value: Optional[str]) -> bool:
+    """Whether `value` is the configured profiling token; always False when none is configured"""
+    return bool(settings.PROFILE_TOKEN) and value is not None and hmac.compare_digest(
+        value.encode(), settings.PROFILE_TOKEN.encode()
+    )
+
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_SITE_PACKAGES = "site-packages" + os.sep
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Trim site-packages and repo prefixes so labels stay readable
+    if _SITE_PACKAGES in filename:
+        filename = filename.split(_SITE_PACKAGES, 1)[1]
+    elif filename.startswith(_REPO_ROOT):
+        filename = filename[len(_REPO_ROOT):]
+    elif filename.startswith(_STDLIB):
+        filename = filename[len(_STDLIB):]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _collapse(frame) -> str:
+    """A stack as root-first, semicolon-separated frames (the folded format flamegraph tools read)"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Profile:
+    """Samples of one thread's stack taken while a request runs"""
+
+    def __init__(self, name: str, thread_id: int):
+        self.name = name
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class StackSampler:
+    """
+    Samples the stacks of profiled threads every PROFILE_INTERVAL_MS
+
+    A single daemon thread runs only while at least one profile is active,
+    so there is no cost at all when nothing is being profiled. Requests
+    share the event loop thread, so a profile also contains samples of any
+    other request that was running at the same moment.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: List[Profile] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, name: str) -> Profile:
+        profile = Profile(name, threading.get_ident())
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile: Profile):
+        with self._lock:
+            self._active.remove(profile)
+
+    def _run(self):
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                profiles = list(self._active)
+            frames = sys._current_frames()
+            stacks: Dict[int, str] = {}
+            for profile in profiles:
+                frame = frames.get(profile.thread_id)
+                if frame is None:
+                    continue
+                if profile.thread_id not in stacks:
+                    stacks[profile.thread_id] = _collapse(frame)
+                profile.samples[stacks[profile.thread_id]] += 1
+            del frames
+            time.sleep(interval)
+
+
+class ProfileStore:
+    """Folded-stack profile files in PROFILE_DIR, keeping the newest PROFILE_MAX_FILES"""
+
+    def save(self, profile: Profile):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, profile.name)
+        with open(path, "w") as f:
+            f.write(profile.folded())
+        for stale in self.list()[settings.PROFILE_MAX_FILES:]:
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, stale["name"]))
+            except OSError:
+                pass
+
+    def list(self) -> List[Dict]:
+        """Stored profiles, newest first"""
+        try:
+            names = [name for name in os.listdir(settings.PROFILE_DIR) if PROFILE_NAME.match(name)]
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names:
+            stat = os.stat(os.path.join(settings.PROFILE_DIR, name))
+            profiles.append({
+                "name": name,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat() + "Z",
+                "bytes": stat.st_size,
+            })
+        return sorted(profiles, key=lambda p: p["name"], reverse=True)
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a stored profile, or None if `name` is not one"""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(settings.PROFILE_DIR, name)
+        return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry the profiling token, plus a sampled fraction of the rest
+
+    A request is profiled when its X-Profile-Token header matches
+    PROFILE_TOKEN, or at random with probability PROFILE_SAMPLE_RATE. Its
+    stack samples are saved as a folded-stack file (readable by
+    flamegraph.pl, speedscope and similar) named in the X-Profile-Id
+    response header. With no token and a zero sample rate, requests pass
+    straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            return False
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return True
+        if not settings.PROFILE_TOKEN:
+            return False
+        for name, value in scope["headers"]:
+            if name == TOKEN_HEADER:
+                return token_matches(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:60] or "root"
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{os.urandom(3).hex()}-{scope['method']}_{slug}.folded"
+        profile = stack_sampler.begin(name)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", name)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            stack_sampler.end(profile)
+            try:
+                profile_store.save(profile)
+            except OSError as e:
+                logger.warning("Could not save profile %s: %s", name, e)
+
+
+# Global instances
+stack_sampler = StackSampler()
+profile_store = ProfileStore()
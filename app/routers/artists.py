@@ -1,15 +1,16 @@
-from fastapi import APIRouter, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Depends
 from app.database import get_database
-from app.models.artist import ArtistPublic
+from app.models.artist import Artist, ArtistPublic, QueueOrderUpdate
+from app.auth import get_artist_data, get_current_active_artist, invalidate_artist
+from app.services.queue_snapshot import queue_snapshots
 
 router = APIRouter(prefix="/artists", tags=["artists"])
 
 @router.get("/{username}", response_model=ArtistPublic)
 async def get_artist_profile(username: str):
     """Get public artist profile by username"""
-    db = get_database()
-    
-    artist_data = db.artists.find_one({"username": username})
+    artist_data = await get_artist_data(username, public=True)
     if not artist_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -20,13 +21,36 @@ async def get_artist_profile(username: str):
         username=artist_data["username"],
         display_name=artist_data["display_name"],
         bio=artist_data.get("bio"),
-        is_active=artist_data["is_active"]
+        is_active=artist_data["is_active"],
+        queue_order=artist_data.get("queue_order", "position")
+    )
+
+@router.put("/me/queue-order", response_model=ArtistPublic)
+async def set_queue_order(
+    order_update: QueueOrderUpdate,
+    current_artist: Artist = Depends(get_current_active_artist)
+):
+    """Choose how the pending queue is ordered: by position or by tip (artist only)"""
+    db = get_database()
+    
+    db.artists.update_one(
+        {"username": current_artist.username},
+        {"$set": {"queue_order": order_update.queue_order.value, "updated_at": datetime.utcnow()}}
+    )
+    # Other instances pick the change up from the change stream and the cache invalidation
+    queue_snapshots.invalidate(current_artist.username)
+    invalidate_artist(current_artist.username)
+    
+    return ArtistPublic(
+        username=current_artist.username,
+        display_name=current_artist.display_name,
+        bio=current_artist.bio,
+        is_active=current_artist.is_active,
+        queue_order=order_update.queue_order
     )
 
 @router.get("/{username}/exists")
 async def check_artist_exists(username: str):
     """Check if an artist exists and is active"""
-    db = get_database()
-    
-    artist_data = db.artists.find_one({"username": username, "is_active": True})
-    return {"exists": artist_data is not None}
\ No newline at end of file
+    artist_data = await get_artist_data(username, public=True)
+    return {"exists": artist_data is not None and artist_data["is_active"]}
\ No newline at end of file
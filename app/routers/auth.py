@@ -96,5 +96,6 @@ async def read_current_artist(current_artist: Artist = Depends(get_current_activ
         username=current_artist.username,
         display_name=current_artist.display_name,
         bio=current_artist.bio,
-        is_active=current_artist.is_active
+        is_active=current_artist.is_active,
+        queue_order=current_artist.queue_order
     )
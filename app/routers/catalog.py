@@ -0,0 +1,79 @@
+from typing import List, Dict
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Query, Depends
+from app.database import get_database
+from app.models.artist import Artist
+from app.models.catalog import RepertoireSong
+from app.auth import get_current_active_artist
+from app.services.catalog import song_catalog
+from app.services.spotify import get_spotify_service
+
+router = APIRouter(prefix="/catalog", tags=["catalog"])
+
+@router.get("/repertoire", response_model=List[RepertoireSong])
+async def get_repertoire(current_artist: Artist = Depends(get_current_active_artist)):
+    """Get the current artist's curated repertoire"""
+    db = get_database()
+
+    songs = db.repertoire.find({"artist_username": current_artist.username}, {"_id": 0})
+    return [RepertoireSong(**song) for song in songs]
+
+@router.put("/repertoire", response_model=List[RepertoireSong])
+async def replace_repertoire(
+    songs: List[RepertoireSong],
+    current_artist: Artist = Depends(get_current_active_artist)
+):
+    """Replace the current artist's curated repertoire (artist only)"""
+    db = get_database()
+
+    now = datetime.utcnow()
+    db.repertoire.delete_many({"artist_username": current_artist.username})
+    if songs:
+        db.repertoire.insert_many([
+            {**song.model_dump(), "artist_username": current_artist.username, "created_at": now}
+            for song in songs
+        ])
+
+    # Rebuild the type-ahead index on the next search
+    song_catalog.invalidate(current_artist.username)
+    return songs
+
+@router.get("/{artist_username}/search", response_model=List[Dict])
+async def search_catalog(
+    artist_username: str,
+    q: str = Query(..., description="Type-ahead query"),
+    limit: int = Query(10, ge=1, le=50, description="Number of results to return (1-50)")
+):
+    """
+    Search the songs an artist plays or has been asked for
+
+    Results come from the in-memory catalog built from the artist's
+    request history and curated repertoire. Spotify is only queried
+    when the catalog has no match.
+
+    Args:
+        artist_username: Artist whose catalog to search
+        q: Search query string
+        limit: Maximum number of results to return (default: 10, max: 50)
+
+    Returns:
+        List of track objects, each tagged with its "source"
+    """
+    if not q or len(q.strip()) < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query cannot be empty"
+        )
+
+    results = song_catalog.search(artist_username, q.strip(), limit)
+    if results is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artist not found"
+        )
+    if results:
+        return [{**entry, "source": "catalog"} for entry in results]
+
+    # Catalog miss - fall back to Spotify
+    tracks = get_spotify_service().search_tracks(q.strip(), limit)
+    return [{**track, "source": "spotify"} for track in tracks]
@@ -1,33 +1,57 @@
-from typing import List
+import csv
+import io
+import json
+from typing import Iterator, List, Optional, Union
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from bson import ObjectId
-from app.database import get_database
-from app.models.request import Request, RequestCreate, RequestUpdate, RequestPublic, RequestReorder
-from app.models.artist import Artist
-from app.auth import get_current_active_artist
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database import get_database, get_public_database
+from app.models.request import (
+    Request, RequestCreate, RequestUpdate, RequestPublic, RequestReorder, RequestStatus,
+    RequestHistoryPage, QueueDelta, QueueOperation, ExportFormat,
+    BulkStatusUpdate, BulkUpdateResult, QueueAdvance
+)
+from app.models.artist import Artist, QueueOrder
+from app.auth import artist_loader, get_artist_data, get_current_active_artist
+from app.services.catalog import song_catalog
+from app.services.tracks import REQUEST_TRACK_FIELDS, track_store
+from app.services.enrichment import enrichment_worker
+from app.services.queue_snapshot import QUEUE_SORTS, queue_snapshots, rank_queue
+from app.services.queue_store import get_queue_store
+from app.timing import TimedJSONResponse, phase
 
 router = APIRouter(prefix="/requests", tags=["requests"])
 
+# Columns of the history export, in order
+EXPORT_FIELDS = [
+    "id", "created_at", "status", "song_title", "song_artist", "requester_name",
+    "message", "tip_amount", "spotify_track_id", "spotify_track_url",
+]
+# History pages are newest first; exports oldest first. _id breaks created_at ties
+HISTORY_SORT = [("created_at", -1), ("_id", -1)]
+EXPORT_SORT = [("created_at", 1), ("_id", 1)]
+
 @router.post("/", response_model=RequestPublic)
 async def create_request(request_data: RequestCreate):
     """Create a new song request"""
     db = get_database()
     
     # Check if artist exists and is active
-    artist = db.artists.find_one({"username": request_data.artist_username, "is_active": True})
-    if not artist:
+    artist = await get_artist_data(request_data.artist_username)
+    if not artist or not artist["is_active"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Artist not found or inactive"
         )
     
     # Get the next queue position for this artist
-    last_request = db.requests.find_one(
-        {"artist_username": request_data.artist_username, "status": "pending"},
-        sort=[("queue_position", -1)]
-    )
-    next_position = (last_request["queue_position"] + 1) if last_request else 1
+    queue_store = get_queue_store()
+    next_position = queue_store.next_position(request_data.artist_username)
     
     # Create the request
     request = Request(
@@ -45,9 +69,15 @@ async def create_request(request_data: RequestCreate):
     )
     
     # Insert into database
-    result = db.requests.insert_one(request.dict(by_alias=True))
+    request_doc = request.dict(by_alias=True)
+    result = db.requests.insert_one(track_store.compact_request(request_doc))
     
     if result.inserted_id:
+        queue_store.add(request.artist_username, str(result.inserted_id), next_position)
+        song_catalog.record_request(request.artist_username, request_doc)
+        queue_snapshots.upsert(request_doc)
+        # Track metadata is resolved off the submission path
+        enrichment_worker.submit(request_doc)
         return RequestPublic(
             id=str(result.inserted_id),
             song_title=request.song_title,
@@ -69,47 +99,178 @@ async def create_request(request_data: RequestCreate):
         detail="Failed to create request"
     )
 
-@router.get("/{artist_username}", response_model=List[RequestPublic])
-async def get_artist_requests(artist_username: str, status_filter: str = "pending"):
-    """Get all requests for an artist (public view)"""
-    db = get_database()
+@router.get("/{artist_username}", response_model=Union[List[RequestPublic], QueueDelta])
+async def get_artist_requests(
+    response: Response,
+    artist_username: str,
+    status_filter: str = "pending",
+    since: Optional[str] = Query(None, description="Queue version held by the client; returns only the changes after it"),
+    fields: Optional[str] = Query(None, description="Comma-separated request fields to return; id is always included")
+):
+    """
+    Get all requests for an artist (public view)
     
-    # Check if artist exists
-    artist = db.artists.find_one({"username": artist_username})
-    if not artist:
+    The pending queue response carries its version in the X-Queue-Version
+    header. Passing it back as `since` returns a QueueDelta with only the
+    operations applied after that version, or the full queue when the
+    change log no longer reaches back that far.
+    
+    Artists in tip mode get their pending queue ordered by tip, highest
+    first, then oldest first; queue_position is then the request's rank.
+    
+    `fields` trims each request to the named fields. Other statuses are
+    then read with a projection; the pending queue is already in memory,
+    so it is only trimmed when serialized. Deltas are never trimmed.
+    """
+    if since is not None and status_filter != "pending":
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artist not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since is only supported for the pending queue"
         )
+    selected = _parse_fields(fields)
     
-    # Build query filter
-    query = {"artist_username": artist_username}
-    if status_filter != "all":
-        query["status"] = status_filter
+    if status_filter != "pending":
+        # Public view tolerates replication lag, so it may be served by a secondary
+        db = get_public_database()
+        await _check_artist_exists(artist_username)
+        if selected is not None:
+            return TimedJSONResponse(_find_sparse_artist_requests(db, artist_username, status_filter, selected))
+        return _find_artist_requests(db, artist_username, status_filter)
     
-    # Get requests sorted by queue position
-    requests_cursor = db.requests.find(query).sort("queue_position", 1)
-    requests = []
-    
-    for request_data in requests_cursor:
-        requests.append(RequestPublic(
-            id=str(request_data["_id"]),
-            song_title=request_data["song_title"],
-            song_artist=request_data["song_artist"],
-            requester_name=request_data["requester_name"],
-            message=request_data.get("message"),
-            tip_amount=request_data.get("tip_amount"),
-            status=request_data["status"],
-            queue_position=request_data["queue_position"],
-            created_at=request_data["created_at"],
-            spotify_track_id=request_data.get("spotify_track_id"),
-            spotify_track_url=request_data.get("spotify_track_url"),
-            album_image_url=request_data.get("album_image_url"),
-            preview_url=request_data.get("preview_url")
+    if since is not None:
+        delta = queue_snapshots.changes_since(artist_username, since)
+        if delta is not None:
+            version, ops = delta
+            return _delta_response(QueueDelta(
+                version=version,
+                full=False,
+                operations=[_to_queue_operation(op) for op in ops]
+            ))
+    
+    # The pending queue is served from memory once its snapshot is loaded
+    versioned = queue_snapshots.get_versioned(artist_username)
+    if versioned is None:
+        # Snapshots are kept current by the change stream, so load from the primary
+        db = get_database()
+        order = await _get_queue_order(artist_username)
+        queue_snapshots.begin_load(artist_username)
+        queue = _expand_requests(list(
+            db.requests.find({"artist_username": artist_username, "status": "pending"})
+            .sort(QUEUE_SORTS[order])
         ))
+        if order == QueueOrder.POSITION:
+            queue = get_queue_store().with_live_positions(artist_username, queue)
+        queue_snapshots.load(artist_username, queue, order)
+        if order == QueueOrder.TIPS:
+            queue = rank_queue(queue)
+        # An unversioned result only happens if the snapshot was evicted at once
+        versioned = queue_snapshots.get_versioned(artist_username) or ("", queue)
+    version, queue = versioned
     
+    if selected is not None and since is None:
+        with phase("model"):
+            content = [_to_sparse_request(request_data, selected) for request_data in queue]
+        return TimedJSONResponse(content, headers={"X-Queue-Version": version})
+    with phase("model"):
+        requests = [_to_request_public(request_data) for request_data in queue]
+    if since is not None:
+        return _delta_response(QueueDelta(version=version, full=True, requests=requests))
+    response.headers["X-Queue-Version"] = version
     return requests
 
+@router.get("/{artist_username}/history", response_model=RequestHistoryPage)
+async def search_request_history(
+    artist_username: str,
+    q: Optional[str] = Query(None, description="Words to match in song title, song artist or requester name"),
+    created_from: Optional[datetime] = Query(None, description="Only requests created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Only requests created before this time"),
+    status_filter: Optional[RequestStatus] = None,
+    limit: int = Query(20, ge=1, le=100, description="Number of results per page (1-100)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated request fields to return; id is always included"),
+    current_artist: Artist = Depends(get_current_active_artist)
+):
+    """
+    Search an artist's request history, newest first (artist only)
+    
+    Text queries use the artist-scoped text index; without one, the
+    date range is read from the (artist_username, created_at) index.
+    Pages are keyed on (created_at, _id), so deep pages cost the same
+    as the first. With `fields`, only those fields are read and returned,
+    and the track lookup is skipped unless a track field is named.
+    """
+    if artist_username != current_artist.username:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to search these requests"
+        )
+    
+    query = _history_query(artist_username, q, created_from, created_to, status_filter, cursor)
+    selected = _parse_fields(fields)
+    
+    # Artist-facing: read from the primary so just-closed requests are included
+    db = get_database()
+    projection = None if selected is None else _sparse_projection(selected, "created_at")
+    requests_data = list(
+        db.requests.find(query, projection)
+        .sort(HISTORY_SORT)
+        .limit(limit + 1)
+    )
+    next_cursor = None
+    if len(requests_data) > limit:
+        requests_data = requests_data[:limit]
+        last = requests_data[-1]
+        next_cursor = f"{last['created_at'].isoformat()}_{last['_id']}"
+    
+    if selected is not None:
+        return TimedJSONResponse({
+            "requests": _to_sparse_request_list(requests_data, selected),
+            "next_cursor": next_cursor
+        })
+    return RequestHistoryPage(
+        requests=_to_request_public_list(requests_data),
+        next_cursor=next_cursor
+    )
+
+@router.get("/{artist_username}/export")
+async def export_request_history(
+    artist_username: str,
+    format: ExportFormat = ExportFormat.CSV,
+    created_from: Optional[datetime] = Query(None, description="Only requests created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Only requests created before this time"),
+    current_artist: Artist = Depends(get_current_active_artist)
+):
+    """
+    Download an artist's full request history as CSV or NDJSON (artist only)
+    
+    Rows are streamed from a MongoDB cursor and encoded one batch at a
+    time, so memory use does not grow with the size of the history.
+    """
+    if artist_username != current_artist.username:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to export these requests"
+        )
+    
+    query = _history_query(artist_username, created_from=created_from, created_to=created_to)
+    
+    cursor = (
+        get_database().requests
+        .find(query, _sparse_projection(EXPORT_FIELDS))
+        .sort(EXPORT_SORT)
+        .batch_size(settings.EXPORT_BATCH_SIZE)
+    )
+    
+    if format == ExportFormat.CSV:
+        media_type = "text/csv"
+    else:
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(cursor, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{artist_username}-requests.{format.value}"'}
+    )
+
 @router.put("/{request_id}", response_model=RequestPublic)
 async def update_request(
     request_id: str,
@@ -126,6 +287,13 @@ async def update_request(
             detail="Invalid request ID"
         )
     
+    # Tip order decides positions, as it does for /reorder
+    if request_update.queue_position is not None and current_artist.queue_order == QueueOrder.TIPS:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Queue is ordered by tips; switch to position order to reorder it"
+        )
+    
     # Find the request
     request_data = db.requests.find_one({"_id": ObjectId(request_id)})
     if not request_data:
@@ -141,11 +309,18 @@ async def update_request(
             detail="Not authorized to update this request"
         )
     
-    # Prepare update data
+    # Prepare update data; pending positions are changed through the queue store below
     update_data = {"updated_at": datetime.utcnow()}
     if request_update.status is not None:
         update_data["status"] = request_update.status
-    if request_update.queue_position is not None:
+    queue_store = get_queue_store()
+    was_pending = request_data["status"] == RequestStatus.PENDING
+    is_pending = update_data.get("status", request_data["status"]) == RequestStatus.PENDING
+    if is_pending and not was_pending:
+        # A request moved back to pending rejoins the end of the queue
+        update_data["queue_position"] = queue_store.next_position(current_artist.username)
+    elif not is_pending and request_update.queue_position is not None:
+        # Outside the queue the position is only recorded
         update_data["queue_position"] = request_update.queue_position
     
     # Update the request
@@ -160,23 +335,25 @@ async def update_request(
             detail="Failed to update request"
         )
     
+    if was_pending and not is_pending:
+        # The request left the queue; close the gap it left, as deleting it does
+        queue_snapshots.remove(request_id)
+        _close_queue_gap(current_artist.username, request_id, request_data["queue_position"])
+    elif is_pending:
+        if not was_pending:
+            queue_store.add(current_artist.username, request_id, update_data["queue_position"])
+        if request_update.queue_position is not None:
+            queue_snapshots.set_positions(
+                current_artist.username,
+                queue_store.move(current_artist.username, {request_id: request_update.queue_position})
+            )
+    
     # Return updated request
-    updated_request = db.requests.find_one({"_id": ObjectId(request_id)})
-    return RequestPublic(
-        id=str(updated_request["_id"]),
-        song_title=updated_request["song_title"],
-        song_artist=updated_request["song_artist"],
-        requester_name=updated_request["requester_name"],
-        message=updated_request.get("message"),
-        tip_amount=updated_request.get("tip_amount"),
-        status=updated_request["status"],
-        queue_position=updated_request["queue_position"],
-        created_at=updated_request["created_at"],
-        spotify_track_id=updated_request.get("spotify_track_id"),
-        spotify_track_url=updated_request.get("spotify_track_url"),
-        album_image_url=updated_request.get("album_image_url"),
-        preview_url=updated_request.get("preview_url")
-    )
+    updated_request = _expand_requests([db.requests.find_one({"_id": ObjectId(request_id)})])[0]
+    if updated_request["status"] == RequestStatus.PENDING:
+        updated_request = queue_store.with_live_positions(current_artist.username, [updated_request])[0]
+    queue_snapshots.upsert(updated_request)
+    return _to_request_public(updated_request)
 
 @router.delete("/{request_id}")
 async def delete_request(
@@ -217,10 +394,11 @@ async def delete_request(
             detail="Failed to delete request"
         )
     
+    queue_snapshots.remove(request_id)
+    
     # Reorder remaining requests to fill the gap
-    await _reorder_queue_after_deletion(
-        db, current_artist.username, request_data["queue_position"]
-    )
+    if request_data["status"] == RequestStatus.PENDING:
+        _close_queue_gap(current_artist.username, request_id, request_data["queue_position"])
     
     return {"message": "Request deleted successfully"}
 
@@ -232,6 +410,12 @@ async def reorder_requests(
     """Reorder multiple requests in the queue (artist only)"""
     db = get_database()
     
+    if current_artist.queue_order == QueueOrder.TIPS:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Queue is ordered by tips; switch to position order to reorder it"
+        )
+    
     # Validate all request IDs and ownership
     for item in reorder_data:
         if not ObjectId.is_valid(item.request_id):
@@ -254,23 +438,330 @@ async def reorder_requests(
             )
     
     # Update queue positions
-    for item in reorder_data:
-        db.requests.update_one(
-            {"_id": ObjectId(item.request_id)},
-            {"$set": {"queue_position": item.new_position, "updated_at": datetime.utcnow()}}
+    moved = get_queue_store().move(
+        current_artist.username,
+        {item.request_id: item.new_position for item in reorder_data}
+    )
+    queue_snapshots.set_positions(current_artist.username, moved)
+    
+    # Return updated queue, read from the primary so it includes the writes above
+    return _find_artist_requests(db, current_artist.username, "pending")
+
+@router.post("/queue/complete-next", response_model=QueueAdvance)
+async def complete_next_request(current_artist: Artist = Depends(get_current_active_artist)):
+    """
+    Mark the request at the head of the queue completed and return the next one (artist only)
+    
+    The head is picked and updated atomically, so two taps never complete
+    the same request twice.
+    """
+    db = get_database()
+    queue_store = get_queue_store()
+    
+    if current_artist.queue_order == QueueOrder.TIPS:
+        completed = db.requests.find_one_and_update(
+            {"artist_username": current_artist.username, "status": "pending"},
+            {"$set": {"status": RequestStatus.COMPLETED.value, "updated_at": datetime.utcnow()}},
+            sort=QUEUE_SORTS[QueueOrder.TIPS],
+            return_document=ReturnDocument.AFTER
+        )
+        if completed:
+            _close_queue_gap(current_artist.username, str(completed["_id"]), completed["queue_position"])
+        next_request = db.requests.find_one(
+            {"artist_username": current_artist.username, "status": "pending"},
+            sort=QUEUE_SORTS[QueueOrder.TIPS]
         )
+        if next_request:
+            next_request["queue_position"] = 1
+    else:
+        completed = queue_store.complete_head(current_artist.username)
+        if completed:
+            queue_snapshots.shift_after(current_artist.username, completed["queue_position"])
+        next_request = queue_store.first(current_artist.username)
+    if not completed:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No pending requests"
+        )
+    queue_snapshots.upsert(completed)
+    return QueueAdvance(
+        completed=_to_request_public_list([completed])[0],
+        next=_to_request_public_list([next_request])[0] if next_request else None
+    )
+
+@router.post("/queue/clear", response_model=BulkUpdateResult)
+async def clear_queue(
+    new_status: RequestStatus = Query(RequestStatus.REJECTED, description="Status given to every pending request"),
+    current_artist: Artist = Depends(get_current_active_artist)
+):
+    """Take every pending request out of the queue, e.g. after a set (artist only)"""
+    if new_status == RequestStatus.PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="new_status must be completed or rejected"
+        )
+    db = get_database()
     
-    # Return updated queue
-    return await get_artist_requests(current_artist.username, "pending")
+    result = db.requests.update_many(
+        {"artist_username": current_artist.username, "status": "pending"},
+        {"$set": {"status": new_status.value, "updated_at": datetime.utcnow()}}
+    )
+    get_queue_store().clear(current_artist.username)
+    queue_snapshots.set_status(current_artist.username, new_status.value)
+    return BulkUpdateResult(updated=result.modified_count)
 
-async def _reorder_queue_after_deletion(db, artist_username: str, deleted_position: int):
-    """Helper function to reorder queue after a request is deleted"""
-    # Move all requests with higher positions down by 1
-    db.requests.update_many(
+@router.post("/queue/status", response_model=BulkUpdateResult)
+async def set_requests_status(
+    bulk_update: BulkStatusUpdate,
+    current_artist: Artist = Depends(get_current_active_artist)
+):
+    """
+    Complete or reject several pending requests at once (artist only)
+    
+    IDs that are not pending requests of the current artist are skipped.
+    The remaining queue is renumbered in a single pass.
+    """
+    if bulk_update.status == RequestStatus.PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="status must be completed or rejected"
+        )
+    for request_id in bulk_update.request_ids:
+        if not ObjectId.is_valid(request_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid request ID: {request_id}"
+            )
+    db = get_database()
+    
+    result = db.requests.update_many(
         {
-            "artist_username": artist_username,
-            "queue_position": {"$gt": deleted_position},
+            "_id": {"$in": [ObjectId(request_id) for request_id in bulk_update.request_ids]},
+            "artist_username": current_artist.username,
             "status": "pending"
         },
-        {"$inc": {"queue_position": -1}}
-    )
\ No newline at end of file
+        {"$set": {"status": bulk_update.status.value, "updated_at": datetime.utcnow()}}
+    )
+    queue_snapshots.set_status(current_artist.username, bulk_update.status.value, bulk_update.request_ids)
+    if result.modified_count:
+        # One renumbering pass for everything that left the queue
+        moved = get_queue_store().remove_many(current_artist.username, bulk_update.request_ids)
+        queue_snapshots.set_positions(current_artist.username, moved)
+    return BulkUpdateResult(updated=result.modified_count)
+
+async def _check_artist_exists(artist_username: str):
+    """Raise 404 if the artist does not exist"""
+    if not await get_artist_data(artist_username, public=True):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artist not found"
+        )
+
+async def _get_queue_order(artist_username: str) -> QueueOrder:
+    """Get the artist's pending-queue order, raising 404 if the artist does not exist"""
+    # Not cached: a snapshot reload after a queue-order change must see the new order
+    artist_data = await artist_loader.load(artist_username)
+    if not artist_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artist not found"
+        )
+    return QueueOrder(artist_data.get("queue_order", QueueOrder.POSITION))
+
+def _export_rows(cursor, format: ExportFormat) -> Iterator[str]:
+    """
+    Encode requests from a cursor one batch at a time
+
+    A plain generator, so Starlette iterates it in a worker thread and the
+    blocking cursor reads stay off the event loop.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    if format == ExportFormat.CSV:
+        writer.writeheader()
+    
+    batch = []
+    try:
+        for request_data in cursor:
+            batch.append(request_data)
+            if len(batch) >= settings.EXPORT_BATCH_SIZE:
+                yield _encode_export_batch(batch, format, writer, buffer)
+                batch = []
+        if batch or buffer.tell():
+            yield _encode_export_batch(batch, format, writer, buffer)
+    finally:
+        cursor.close()
+
+def _encode_export_batch(batch: List[dict], format: ExportFormat, writer: csv.DictWriter, buffer: io.StringIO) -> str:
+    """Encode one batch of request documents, joining their track URLs in a single lookup"""
+    for request_data in _expand_requests(batch):
+        row = {field: request_data.get(field) for field in EXPORT_FIELDS}
+        row["id"] = str(request_data["_id"])
+        row["created_at"] = request_data["created_at"].isoformat()
+        if format == ExportFormat.CSV:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row))
+            buffer.write("\n")
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+def _history_query(
+    artist_username: str,
+    q: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    status_filter: Optional[RequestStatus] = None,
+    cursor: Optional[str] = None
+) -> dict:
+    """Filter for a history search or export, starting after `cursor` when given"""
+    query = {"artist_username": artist_username}
+    if q and q.strip():
+        query["$text"] = {"$search": q.strip()}
+    if status_filter is not None:
+        query["status"] = status_filter.value
+    created_at = {}
+    if created_from is not None:
+        created_at["$gte"] = created_from
+    if created_to is not None:
+        created_at["$lt"] = created_to
+    if cursor:
+        last_created_at, last_id = _decode_history_cursor(cursor)
+        # The bound narrows the index scan; the $or breaks created_at ties by _id
+        created_at["$lte"] = last_created_at
+        query["$or"] = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "_id": {"$lt": last_id}},
+        ]
+    if created_at:
+        query["created_at"] = created_at
+    return query
+
+def _decode_history_cursor(cursor: str):
+    """Split a history cursor into its created_at and ObjectId, raising 400 if malformed"""
+    created_at, _, request_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), ObjectId(request_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _to_queue_operation(op: dict) -> QueueOperation:
+    """Build the public model for a change log entry"""
+    request = op.get("request")
+    return QueueOperation(
+        op=op["op"],
+        id=op["id"],
+        request=_to_request_public(request) if request else None,
+        status=op.get("status"),
+        queue_position=op.get("queue_position")
+    )
+
+def _delta_response(delta: QueueDelta) -> JSONResponse:
+    """Serialize a delta without null fields to keep it small"""
+    return JSONResponse(
+        content=jsonable_encoder(delta, exclude_none=True),
+        headers={"X-Queue-Version": delta.version}
+    )
+
+def _artist_requests_query(artist_username: str, status_filter: str) -> dict:
+    """Filter for an artist's requests with a status, or "all" of them"""
+    query = {"artist_username": artist_username}
+    if status_filter != "all":
+        query["status"] = status_filter
+    return query
+
+def _find_artist_requests(db, artist_username: str, status_filter: str) -> List[RequestPublic]:
+    """Get an artist's requests sorted by queue position"""
+    query = _artist_requests_query(artist_username, status_filter)
+    requests_data = list(db.requests.find(query).sort("queue_position", 1))
+    if status_filter == "pending":
+        requests_data = get_queue_store().with_live_positions(artist_username, requests_data)
+    return _to_request_public_list(requests_data)
+
+def _find_sparse_artist_requests(db, artist_username: str, status_filter: str, fields: List[str]) -> List[dict]:
+    """Get the selected fields of an artist's requests sorted by queue position"""
+    query = _artist_requests_query(artist_username, status_filter)
+    projection = _sparse_projection(fields, "queue_position")
+    requests_data = list(db.requests.find(query, projection).sort("queue_position", 1))
+    return _to_sparse_request_list(requests_data, fields)
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a fields parameter into RequestPublic field names, id first, raising 400 on unknown names"""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RequestPublic.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+def _sparse_projection(fields: List[str], *needed: str) -> dict:
+    """MongoDB projection for the selected fields plus any the query itself needs"""
+    projection = {field: 1 for field in fields if field != "id"}
+    if any(field in REQUEST_TRACK_FIELDS for field in fields):
+        # Track fields may have to be joined from the track document
+        projection["spotify_track_id"] = 1
+    for field in needed:
+        projection[field] = 1
+    return projection
+
+def _to_sparse_request(request_data: dict, fields: List[str]) -> dict:
+    """Serialize the selected fields of an expanded request document"""
+    sparse = {}
+    for field in fields:
+        value = str(request_data["_id"]) if field == "id" else request_data.get(field)
+        sparse[field] = value.isoformat() if isinstance(value, datetime) else value
+    return sparse
+
+def _to_sparse_request_list(requests_data: List[dict], fields: List[str]) -> List[dict]:
+    """Serialize the selected fields of request documents, joining track metadata only if selected"""
+    if any(field in REQUEST_TRACK_FIELDS for field in fields):
+        requests_data = _expand_requests(requests_data)
+    with phase("model"):
+        return [_to_sparse_request(request_data, fields) for request_data in requests_data]
+
+def _expand_requests(requests_data: List[dict]) -> List[dict]:
+    """Join track metadata into request documents with a single lookup"""
+    tracks = track_store.get_many(r.get("spotify_track_id") for r in requests_data)
+    return [
+        track_store.expand_request(request_data, tracks.get(request_data.get("spotify_track_id")))
+        for request_data in requests_data
+    ]
+
+def _to_request_public(request_data: dict) -> RequestPublic:
+    """Build the public model for an expanded request document"""
+    return RequestPublic(
+        id=str(request_data["_id"]),
+        song_title=request_data["song_title"],
+        song_artist=request_data["song_artist"],
+        requester_name=request_data["requester_name"],
+        message=request_data.get("message"),
+        tip_amount=request_data.get("tip_amount"),
+        status=request_data["status"],
+        queue_position=request_data["queue_position"],
+        created_at=request_data["created_at"],
+        spotify_track_id=request_data.get("spotify_track_id"),
+        spotify_track_url=request_data.get("spotify_track_url"),
+        album_image_url=request_data.get("album_image_url"),
+        preview_url=request_data.get("preview_url")
+    )
+
+def _to_request_public_list(requests_data: List[dict]) -> List[RequestPublic]:
+    """Build public request models, joining track metadata in a single lookup"""
+    expanded = _expand_requests(requests_data)
+    with phase("model"):
+        return [_to_request_public(request_data) for request_data in expanded]
+
+def _close_queue_gap(artist_username: str, request_id: str, position: int):
+    """Move every request after one that left the queue up by one"""
+    position = get_queue_store().remove(artist_username, request_id, position)
+    if position is not None:
+        queue_snapshots.shift_after(artist_username, position)
@@ -1,6 +1,6 @@
 from typing import List, Dict
 from fastapi import APIRouter, HTTPException, status, Query
-from app.services.spotify import spotify_service
+from app.services.spotify import get_spotify_service
 
 router = APIRouter(prefix="/spotify", tags=["spotify"])
 
@@ -26,7 +26,7 @@ async def search_tracks(
         )
     
     try:
-        tracks = spotify_service.search_tracks(q.strip(), limit)
+        tracks = get_spotify_service().search_tracks(q.strip(), limit)
         return tracks
     except HTTPException:
         raise
@@ -54,7 +54,7 @@ async def get_track(track_id: str):
         )
     
     try:
-        track = spotify_service.get_track(track_id.strip())
+        track = get_spotify_service().get_track(track_id.strip())
         if not track:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,39 @@
+"""
+Production server entry point
+
+Run with `python -m app.server`. Starts uvicorn with the configured number
+of worker processes, using uvloop and httptools when they are installed.
+Each worker runs the app lifespan on its own, so every worker creates its
+own MongoClient after it has started (pymongo clients are not fork-safe)
+with the pool sizes from settings. On SIGTERM/SIGINT uvicorn stops
+accepting connections and drains in-flight requests for up to
+GRACEFUL_SHUTDOWN_SECONDS before exiting.
+"""
+import importlib.util
+import uvicorn
+from app.config import settings
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    """Start the production server"""
+    uvicorn.run(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WEB_CONCURRENCY,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        timeout_keep_alive=settings.KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_SECONDS,
+        access_log=not settings.is_production,
+    )
+
+
+if __name__ == "__main__":
+    main()
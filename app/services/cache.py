@@ -0,0 +1,263 @@
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+from app.config import settings
+from app.services.resilience import CircuitBreaker, CircuitOpenError, StaleCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class CacheNamespace:
+    """
+    One kind of cached value with its own TTLs
+
+    Values are fresh for `ttl` seconds and may be served as stale, flagged
+    so the caller can revalidate, until `stale_ttl`. Keys are strings and
+    values must be JSON-serialisable; datetimes and other objects come back
+    from the shared tier as strings.
+    """
+
+    def __init__(self, cache: "TieredCache", name: str, ttl: float, stale_ttl: Optional[float], max_entries: int):
+        self.cache = cache
+        self.name = name
+        self.local = StaleCache(
+            max_entries=max_entries, ttl=ttl, stale_ttl=stale_ttl if stale_ttl is not None else ttl
+        )
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self) -> float:
+        return self.local.ttl
+
+    @ttl.setter
+    def ttl(self, seconds: float):
+        self.local.ttl = seconds
+
+    @property
+    def stale_ttl(self) -> float:
+        return self.local.stale_ttl
+
+    def _shared_key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    def get(self, key: str) -> Tuple[Optional[Any], bool]:
+        """The cached value and whether it is stale, or (None, False)"""
+        value, is_stale = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, is_stale
+        found = self.cache._shared_get(self, [key])
+        if key in found:
+            self.shared_hits += 1
+            return found[key]
+        self.misses += 1
+        return None, False
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[Any, bool]]:
+        """Like get for several keys, with one round trip to the shared tier for local misses"""
+        found = {}
+        missing = []
+        for key in keys:
+            value, is_stale = self.local.get(key)
+            if value is not None:
+                found[key] = (value, is_stale)
+            else:
+                missing.append(key)
+        shared = self.cache._shared_get(self, missing) if missing else {}
+        self.hits += len(found)
+        self.shared_hits += len(shared)
+        self.misses += len(missing) - len(shared)
+        found.update(shared)
+        return found
+
+    def set(self, key: str, value: Any):
+        self.local.set(key, value)
+        self.cache._shared_set(self, key, value)
+
+    def invalidate(self, key: str):
+        """Drop a key here, in the shared tier and in every other instance's local tier"""
+        self.local.delete(key)
+        self.cache._shared_invalidate(self, key)
+
+    def snapshot(self) -> Dict:
+        return {
+            "entries": len(self.local),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+        }
+
+
+class TieredCache:
+    """
+    Two-tier cache: a bounded in-process LRU in front of an optional shared Redis
+
+    Every instance keeps its own local tier. When CACHE_REDIS_URL is set,
+    values are also written to Redis with an expiry of the namespace's
+    stale TTL, so a local miss on one instance can be filled from what
+    another instance fetched, and invalidations are published so every
+    instance drops its local copy. Redis is an optimisation only: errors
+    or slow responses open a short circuit and the cache carries on with
+    the local tier alone.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self.namespaces: Dict[str, CacheNamespace] = {}
+        self.instance_id = uuid.uuid4().hex
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=settings.CACHE_L2_RETRY_SECONDS)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pubsub = None
+
+    def namespace(self, name: str, ttl: float, stale_ttl: Optional[float] = None,
+                  max_entries: Optional[int] = None) -> CacheNamespace:
+        """Register a namespace, or return the one already registered under `name`"""
+        if name not in self.namespaces:
+            self.namespaces[name] = CacheNamespace(
+                self, name, ttl, stale_ttl, max_entries or settings.CACHE_MAX_ENTRIES
+            )
+        return self.namespaces[name]
+
+    @property
+    def redis(self):
+        """The shared tier's client, or None when only the local tier is used"""
+        if self._client is None and settings.CACHE_REDIS_URL:
+            # Imported here so single-instance deployments never load redis
+            import redis
+            self._client = redis.Redis.from_url(
+                settings.CACHE_REDIS_URL,
+                decode_responses=True,
+                socket_timeout=settings.CACHE_L2_TIMEOUT_SECONDS,
+                socket_connect_timeout=settings.CACHE_L2_TIMEOUT_SECONDS
+            )
+        return self._client
+
+    @property
+    def _redis_error(self):
+        import redis
+        return redis.RedisError
+
+    def _shared_call(self, fn, *args):
+        """Run a Redis call unless the shared tier is failing; None if it was skipped or failed"""
+        if self.redis is None:
+            return None
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            return None
+        try:
+            result = fn(*args)
+        except self._redis_error as e:
+            self.breaker.record_failure()
+            logger.warning("Shared cache unavailable: %s", e)
+            return None
+        self.breaker.record_success()
+        return result
+
+    def _shared_get(self, namespace: CacheNamespace, keys: list) -> Dict[str, Tuple[Any, bool]]:
+        if self.redis is None:
+            return {}
+        raw = self._shared_call(self.redis.mget, [namespace._shared_key(key) for key in keys])
+        found = {}
+        now = time.time()
+        for key, item in zip(keys, raw or []):
+            if item is None:
+                continue
+            entry = json.loads(item)
+            age = now - entry["at"]
+            if age > namespace.stale_ttl:
+                continue
+            # Keep the entry's age so it goes stale here when it does everywhere else
+            namespace.local.set(key, entry["value"], age=age)
+            found[key] = (entry["value"], age > namespace.ttl)
+        return found
+
+    def _shared_set(self, namespace: CacheNamespace, key: str, value: Any):
+        if self.redis is None:
+            return
+        payload = json.dumps({"at": time.time(), "value": value}, default=_encode)
+        self._shared_call(self.redis.set, namespace._shared_key(key), payload, math.ceil(namespace.stale_ttl))
+
+    def _shared_invalidate(self, namespace: CacheNamespace, key: str):
+        if self.redis is None:
+            return
+        message = json.dumps({"origin": self.instance_id, "namespace": namespace.name, "key": key})
+
+        def invalidate():
+            with self.redis.pipeline() as pipe:
+                pipe.delete(namespace._shared_key(key))
+                pipe.publish(INVALIDATION_CHANNEL, message)
+                pipe.execute()
+        self._shared_call(invalidate)
+
+    def _on_invalidation(self, data: str):
+        message = json.loads(data)
+        if message["origin"] == self.instance_id:
+            return
+        namespace = self.namespaces.get(message["namespace"])
+        if namespace is not None:
+            namespace.local.delete(message["key"])
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(INVALIDATION_CHANNEL)
+                while not self._stop.is_set():
+                    message = self._pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._on_invalidation(message["data"])
+            except Exception as e:
+                # Missed invalidations could leave stale local entries; start over empty
+                logger.warning("Cache invalidation listener failed, clearing local tier: %s", e)
+                for namespace in self.namespaces.values():
+                    namespace.local.clear()
+                self._stop.wait(settings.CACHE_L2_RETRY_SECONDS)
+            finally:
+                if self._pubsub is not None:
+                    try:
+                        self._pubsub.close()
+                    except Exception:
+                        pass
+                    self._pubsub = None
+
+    def start(self):
+        """Start listening for invalidations from other instances, if a shared tier is configured"""
+        if self.redis is not None and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def snapshot(self) -> Dict:
+        return {
+            "shared": self.redis is not None,
+            "shared_state": self.breaker.state if self.redis is not None else None,
+            "listening": self._thread is not None,
+            "namespaces": {name: namespace.snapshot() for name, namespace in self.namespaces.items()},
+        }
+
+
+# Global instance
+cache = TieredCache()
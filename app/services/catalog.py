@@ -0,0 +1,238 @@
+import re
+import time
+import unicodedata
+from typing import List, Dict, Optional, Set
+from app.config import settings
+from app.database import get_database
+from app.services.tracks import track_store
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_TOKEN_RE.findall(text.lower()))
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def catalog_key(song_title: str, song_artist: str) -> str:
+    """
+    Key that identifies a song within an artist's catalog
+
+    Songs are keyed by title and artist, not by Spotify ID, so a song
+    requested both with and without an ID is a single entry.
+    """
+    return f"{normalize(song_title)}|{normalize(song_artist)}"
+
+
+def request_counts_pipeline(artist_username: str) -> List[Dict]:
+    """Aggregation returning one row per distinct song the audience has asked for"""
+    return [
+        {"$match": {"artist_username": artist_username}},
+        # Rows that still differ in punctuation or accents are merged by catalog_key
+        {"$group": {
+            "_id": {"$concat": [{"$toLower": "$song_title"}, "|", {"$toLower": "$song_artist"}]},
+            "song_title": {"$first": "$song_title"},
+            "song_artist": {"$first": "$song_artist"},
+            "spotify_track_id": {"$max": "$spotify_track_id"},
+            "spotify_track_url": {"$max": "$spotify_track_url"},
+            "album_image_url": {"$max": "$album_image_url"},
+            "preview_url": {"$max": "$preview_url"},
+            "request_count": {"$sum": 1},
+        }},
+    ]
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.keys: Set[str] = set()
+
+
+class ArtistCatalog:
+    """In-memory type-ahead index over the songs known for one artist"""
+
+    def __init__(self, artist_username: str):
+        self.artist_username = artist_username
+        self.entries: Dict[str, Dict] = {}
+        self.loaded_at = time.monotonic()
+        self._root = _TrieNode()
+        self._grams: Dict[str, Set[str]] = {}
+
+    def add(self, song_title: str, song_artist: str, spotify_track_id: Optional[str] = None,
+            album_image_url: Optional[str] = None, preview_url: Optional[str] = None,
+            spotify_track_url: Optional[str] = None, request_count: int = 0,
+            curated: bool = False):
+        """Add a song to the index, or merge it into the existing entry"""
+        key = catalog_key(song_title, song_artist)
+        entry = self.entries.get(key)
+        if entry:
+            entry["request_count"] += request_count
+            entry["curated"] = entry["curated"] or curated
+            # Keep the first non-empty value we have seen for each field
+            for field, value in (("id", spotify_track_id),
+                                 ("album_image", album_image_url),
+                                 ("preview_url", preview_url),
+                                 ("external_url", spotify_track_url)):
+                if value and not entry[field]:
+                    entry[field] = value
+            return
+
+        self.entries[key] = {
+            "id": spotify_track_id,
+            "name": song_title,
+            "artist": song_artist,
+            "album_image": album_image_url,
+            "preview_url": preview_url,
+            "external_url": spotify_track_url,
+            "request_count": request_count,
+            "curated": curated,
+        }
+
+        text = normalize(f"{song_title} {song_artist}")
+        for token in set(text.split()):
+            node = self._root
+            for char in token:
+                node = node.children.setdefault(char, _TrieNode())
+                node.keys.add(key)
+        for gram in _trigrams(text):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def _prefix_keys(self, prefix: str) -> Set[str]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.keys
+
+    def _rank(self, keys, scores: Optional[Dict[str, float]] = None) -> List[str]:
+        def sort_key(key):
+            entry = self.entries[key]
+            score = scores[key] if scores else 0
+            return (-score, not entry["curated"], -entry["request_count"], entry["name"])
+        return sorted(keys, key=sort_key)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Find songs matching a type-ahead query
+
+        Every query token must prefix-match a word of the title or artist.
+        When nothing matches that way, fall back to trigram similarity so
+        typos still find the song.
+        """
+        text = normalize(query)
+        if not text:
+            return []
+
+        matched: Optional[Set[str]] = None
+        for token in text.split():
+            keys = self._prefix_keys(token)
+            matched = set(keys) if matched is None else matched & keys
+            if not matched:
+                break
+        if matched:
+            return [self.entries[k] for k in self._rank(matched)[:limit]]
+
+        query_grams = _trigrams(text)
+        overlap: Dict[str, int] = {}
+        for gram in query_grams:
+            for key in self._grams.get(gram, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+        threshold = settings.CATALOG_FUZZY_THRESHOLD
+        scores = {
+            key: count / len(query_grams)
+            for key, count in overlap.items()
+            if count / len(query_grams) >= threshold
+        }
+        return [self.entries[k] for k in self._rank(scores, scores)[:limit]]
+
+
+class SongCatalog:
+    """Per-artist song catalogs built from request history and curated repertoire"""
+
+    def __init__(self):
+        self._catalogs: Dict[str, ArtistCatalog] = {}
+
+    def _build(self, artist_username: str) -> Optional[ArtistCatalog]:
+        db = get_database()
+        if not db.artists.find_one({"username": artist_username}, {"_id": 1}):
+            self._catalogs.pop(artist_username, None)
+            return None
+        catalog = ArtistCatalog(artist_username)
+
+        for song in db.repertoire.find({"artist_username": artist_username}):
+            catalog.add(
+                song["song_title"],
+                song["song_artist"],
+                spotify_track_id=song.get("spotify_track_id"),
+                album_image_url=song.get("album_image_url"),
+                preview_url=song.get("preview_url"),
+                spotify_track_url=song.get("spotify_track_url"),
+                curated=True
+            )
+
+        songs = list(db.requests.aggregate(request_counts_pipeline(artist_username)))
+        tracks = track_store.get_many(song.get("spotify_track_id") for song in songs)
+        for song in songs:
+            song = track_store.expand_request(song, tracks.get(song.get("spotify_track_id")))
+            catalog.add(
+                song["song_title"],
+                song["song_artist"],
+                spotify_track_id=song.get("spotify_track_id"),
+                album_image_url=song.get("album_image_url"),
+                preview_url=song.get("preview_url"),
+                spotify_track_url=song.get("spotify_track_url"),
+                request_count=song["request_count"]
+            )
+
+        self._catalogs[artist_username] = catalog
+        return catalog
+
+    def get(self, artist_username: str) -> Optional[ArtistCatalog]:
+        """Get the catalog for an artist, rebuilding it once it is older than the TTL
+
+        Returns None if the artist does not exist.
+        """
+        catalog = self._catalogs.get(artist_username)
+        if catalog is None or time.monotonic() - catalog.loaded_at > settings.CATALOG_TTL_SECONDS:
+            catalog = self._build(artist_username)
+        return catalog
+
+    def search(self, artist_username: str, query: str, limit: int = 10) -> Optional[List[Dict]]:
+        """Search an artist's catalog, or return None if the artist does not exist"""
+        catalog = self.get(artist_username)
+        if catalog is None:
+            return None
+        return catalog.search(query, limit)
+
+    def record_request(self, artist_username: str, request: Dict):
+        """Add a newly submitted request to the artist's catalog if it is loaded"""
+        catalog = self._catalogs.get(artist_username)
+        if catalog is None:
+            return
+        catalog.add(
+            request["song_title"],
+            request["song_artist"],
+            spotify_track_id=request.get("spotify_track_id"),
+            album_image_url=request.get("album_image_url"),
+            preview_url=request.get("preview_url"),
+            spotify_track_url=request.get("spotify_track_url"),
+            request_count=1
+        )
+
+    def invalidate(self, artist_username: str):
+        """Drop an artist's catalog so the next search rebuilds it"""
+        self._catalogs.pop(artist_username, None)
+
+
+# Global instance
+song_catalog = SongCatalog()
@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from app.config import settings
+from app.database import get_database
+from app.services.catalog import normalize
+from app.services.queue_snapshot import queue_snapshots
+from app.services.queue_store import get_queue_store
+from app.services.spotify import get_spotify_service
+from app.services.tracks import REQUEST_TRACK_FIELDS, track_store
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentWorker:
+    """
+    Resolves Spotify track metadata for new requests in the background
+
+    `create_request` hands each new request to `submit`, which only appends
+    to an in-memory queue. A background thread takes batches of up to
+    ENRICHMENT_BATCH_SIZE requests: requests without a Spotify ID are
+    matched by title and artist through the (cached) search, then every
+    ID in the batch is validated with one multi-track call. Requests get
+    the resolved `spotify_track_id` in a single bulk write, and client-sent
+    URL fields are dropped in favour of the track document. IDs Spotify
+    does not know are removed; the request keeps the URLs it was sent with.
+    A search that fails on its own puts back only its request. While
+    Spotify is throttling or its circuit is open, the whole batch is put
+    back and retried after its Retry-After.
+    """
+
+    def __init__(self):
+        self._queue: deque = deque()
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.enriched = 0
+        self.not_found = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.last_lag_seconds = 0.0
+
+    def submit(self, request_doc: Dict):
+        """Queue a newly created request; never blocks the caller"""
+        if self._thread is None:
+            return
+        with self._ready:
+            if len(self._queue) >= settings.ENRICHMENT_QUEUE_SIZE:
+                self.dropped += 1
+                return
+            self._queue.append({
+                "_id": request_doc["_id"],
+                "song_title": request_doc["song_title"],
+                "song_artist": request_doc["song_artist"],
+                "spotify_track_id": request_doc.get("spotify_track_id"),
+                "enqueued_at": time.monotonic(),
+                "attempts": 0,
+            })
+            self._ready.notify()
+
+    def snapshot(self) -> Dict:
+        with self._ready:
+            depth = len(self._queue)
+            oldest = self._queue[0]["enqueued_at"] if self._queue else None
+        return {
+            "running": self._thread is not None,
+            "depth": depth,
+            "oldest_wait_seconds": round(time.monotonic() - oldest, 1) if oldest else 0,
+            "last_lag_seconds": round(self.last_lag_seconds, 2),
+            "enriched": self.enriched,
+            "not_found": self.not_found,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
+
+    def _next_batch(self) -> List[Dict]:
+        """Wait for work, then give other submissions a moment to join the batch"""
+        with self._ready:
+            while not self._queue and not self._stop.is_set():
+                self._ready.wait(timeout=1)
+        if self._queue and len(self._queue) < settings.ENRICHMENT_BATCH_SIZE:
+            self._stop.wait(settings.ENRICHMENT_BATCH_WAIT_SECONDS)
+        with self._ready:
+            size = min(len(self._queue), settings.ENRICHMENT_BATCH_SIZE)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _requeue(self, batch: List[Dict]):
+        with self._ready:
+            for item in reversed(batch):
+                item["attempts"] += 1
+                if item["attempts"] >= settings.ENRICHMENT_MAX_ATTEMPTS:
+                    self.dropped += 1
+                else:
+                    self._queue.appendleft(item)
+
+    @staticmethod
+    def _match(item: Dict, candidates: List[Dict]) -> Optional[str]:
+        """The ID of the search result with the same title and artist, if any"""
+        title = normalize(item["song_title"])
+        artist = normalize(item["song_artist"])
+        for track in candidates:
+            if normalize(track["name"]) == title and artist in normalize(track.get("all_artists") or track["artist"]):
+                return track["id"]
+        return None
+
+    def _process(self, batch: List[Dict]):
+        spotify = get_spotify_service()
+
+        # Resolve IDs for requests that came without one; searches are cached
+        resolved, retry = [], []
+        for item in batch:
+            if not item["spotify_track_id"]:
+                query = f'track:{item["song_title"]} artist:{item["song_artist"]}'
+                try:
+                    candidates = spotify.search_tracks(query, limit=5)
+                except HTTPException as e:
+                    if spotify.breaker.state in ("backoff", "open"):
+                        # Spotify is throttling or down; the whole batch waits it out
+                        raise
+                    # Only this search failed; retry just this request with the next batch
+                    logger.info("Search for request %s failed, will retry: %s", item["_id"], e.detail)
+                    retry.append(item)
+                    continue
+                item["resolved_id"] = self._match(item, candidates)
+            else:
+                item["resolved_id"] = item["spotify_track_id"]
+            resolved.append(item)
+        if resolved:
+            self._apply(spotify, resolved)
+        # Put back last, so a failure above requeues them only once, with the batch
+        self._requeue(retry)
+
+    def _apply(self, spotify, batch: List[Dict]):
+        """Validate the resolved IDs and write every outcome in one bulk write"""
+        # Validate every ID with as few multi-track calls as possible
+        tracks = spotify.get_tracks([item["resolved_id"] for item in batch])
+
+        now = datetime.utcnow()
+        updates = []
+        for item in batch:
+            track_id = item["resolved_id"]
+            if track_id and tracks.get(track_id):
+                self.enriched += 1
+                # The track document now holds validated URLs for this request
+                updates.append(UpdateOne(
+                    {"_id": item["_id"]},
+                    {"$set": {"spotify_track_id": track_id, "enriched_at": now},
+                     "$unset": {field: "" for field in REQUEST_TRACK_FIELDS}}
+                ))
+            else:
+                self.not_found += 1
+                update = {"$set": {"enriched_at": now}}
+                if item["spotify_track_id"]:
+                    # Spotify does not know the ID the client sent
+                    update["$unset"] = {"spotify_track_id": ""}
+                updates.append(UpdateOne({"_id": item["_id"]}, update))
+
+        db = get_database()
+        db.requests.bulk_write(updates, ordered=False)
+
+        # Apply locally right away; other instances get it from the change stream
+        patched = list(db.requests.find({"_id": {"$in": [item["_id"] for item in batch]}, "status": "pending"}))
+        found = track_store.get_many(r.get("spotify_track_id") for r in patched)
+        queue_store = get_queue_store()
+        for request in patched:
+            request = track_store.expand_request(request, found.get(request.get("spotify_track_id")))
+            # MongoDB positions trail the queue store's until they are persisted
+            queue_snapshots.upsert(queue_store.with_live_positions(request["artist_username"], [request])[0])
+
+        self.last_lag_seconds = time.monotonic() - min(item["enqueued_at"] for item in batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._process(batch)
+            except ValueError as e:
+                # Spotify credentials are not configured; nothing to enrich with
+                logger.warning("Request enrichment disabled: %s", e)
+                self.dropped += len(batch)
+            except HTTPException as e:
+                # Spotify is backing off or failing; retry the batch after the window
+                self.failed_batches += 1
+                self._requeue(batch)
+                retry_after = float((e.headers or {}).get("Retry-After", settings.SPOTIFY_BREAKER_RESET_SECONDS))
+                logger.info("Request enrichment paused for %.0fs: %s", retry_after, e.detail)
+                self._stop.wait(retry_after)
+            except Exception:
+                logger.exception("Request enrichment batch failed")
+                self.failed_batches += 1
+                self._requeue(batch)
+                self._stop.wait(1)
+
+    def start(self):
+        """Start the enrichment thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="request-enrichment", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._ready:
+            self._ready.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+
+# Global instance
+enrichment_worker = EnrichmentWorker()
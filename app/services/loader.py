@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class BatchLoader:
+    """
+    Coalesces lookups made in the same event-loop tick into one batched query
+
+    `load(key)` registers the key and returns a future. The first load in
+    a tick schedules a dispatch with `call_soon`, so it runs once every
+    handler that is ready in this tick has had its turn. The dispatch
+    deduplicates the keys, calls `batch_fn` once with all of them, and
+    resolves every waiter with the value found for its key, or None.
+    Nothing is kept after the dispatch; caching is left to the caller.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Dict[Hashable, Any]]):
+        self.batch_fn = batch_fn
+        self._pending: Dict[Hashable, List[asyncio.Future]] = {}
+        # Loop the next dispatch is scheduled on, if any
+        self._scheduled_on: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.loads = 0
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        self.loads += 1
+        if self._scheduled_on is not loop:
+            self._scheduled_on = loop
+            loop.call_soon(self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._scheduled_on = None
+        self.batches += 1
+        try:
+            found = self.batch_fn(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, futures in pending.items():
+            for future in futures:
+                # A waiter may have been cancelled while the batch ran
+                if not future.done():
+                    future.set_result(found.get(key))
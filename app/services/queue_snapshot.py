@@ -0,0 +1,352 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo.errors import OperationFailure, PyMongoError
+from app.config import settings
+from app.database import get_database
+from app.models.artist import QueueOrder
+from app.services.queue_store import get_queue_store
+from app.services.tracks import REQUEST_TRACK_FIELDS, track_store
+
+logger = logging.getLogger(__name__)
+
+# MongoDB sort for each pending-queue order; each has a matching index
+QUEUE_SORTS = {
+    QueueOrder.POSITION: [("queue_position", 1)],
+    QueueOrder.TIPS: [("tip_amount", -1), ("created_at", 1)],
+}
+
+
+# Fields whose change is sent to delta clients as an "updated" operation
+TRACK_FIELDS = ["spotify_track_id", *REQUEST_TRACK_FIELDS]
+
+
+def _tip_key(request: Dict):
+    # Same order as the index: tips high to low, untipped last, then oldest first
+    tip = request.get("tip_amount")
+    return (tip is None, -(tip or 0), request["created_at"])
+
+
+def rank_queue(requests: List[Dict]) -> List[Dict]:
+    """Copies of tip-ordered requests with queue_position set to their rank"""
+    return [{**request, "queue_position": rank} for rank, request in enumerate(requests, 1)]
+
+
+def _digest(request: Dict) -> int:
+    """Hash of what a delta client holds for a queued request"""
+    state = [str(request["_id"]), request["queue_position"], *(request.get(field) for field in TRACK_FIELDS)]
+    return int.from_bytes(hashlib.blake2b(repr(state).encode(), digest_size=8).digest(), "big")
+
+
+class _ChangeLog:
+    """
+    Bounded log of queue operations since a snapshot was loaded
+
+    A version is a hash of the queue's content, the XOR of one digest per
+    request, so every worker and instance holding the same queue reports
+    the same version and can answer `since` for a version another one sent.
+    """
+
+    def __init__(self, queue: Dict[str, Dict]):
+        self._digests = {request_id: _digest(request) for request_id, request in queue.items()}
+        self._state = 0
+        for digest in self._digests.values():
+            self._state ^= digest
+        self.loaded_version = self.version
+        self.dropped = False
+        self.ops = deque(maxlen=settings.QUEUE_CHANGE_LOG_SIZE)
+
+    @property
+    def version(self) -> str:
+        return f"{self._state:016x}"
+
+    def append(self, op: str, request_id: str, current: Optional[Dict], **data):
+        """Record an operation; `current` is the request after it, or None once it left the queue"""
+        self._state ^= self._digests.pop(request_id, 0)
+        if current is not None:
+            self._digests[request_id] = _digest(current)
+            self._state ^= self._digests[request_id]
+        self.dropped = self.dropped or len(self.ops) == self.ops.maxlen
+        self.ops.append({"version": self.version, "op": op, "id": request_id, **data})
+
+    def since(self, version: str) -> Optional[List[Dict]]:
+        """Operations after `version`, or None if the log does not reach back to it"""
+        if version == self.version:
+            return []
+        ops = list(self.ops)
+        # The queue may have been in that state more than once; the latest is enough
+        for index in range(len(ops) - 1, -1, -1):
+            if ops[index]["version"] == version:
+                return ops[index + 1:]
+        if version == self.loaded_version and not self.dropped:
+            return ops
+        return None
+
+
+class QueueSnapshots:
+    """
+    In-memory copies of each artist's pending queue
+
+    Snapshots hold request documents with track metadata already joined,
+    so the public queue view never touches MongoDB once an artist's queue
+    is loaded. The mutating routes update snapshots write-through, and a
+    change stream on `requests` applies writes made by other instances
+    (and drops a snapshot when its artist switches queue order).
+    If the stream drops, every snapshot is discarded and reloaded on the
+    next read. Without a change stream (e.g. a standalone mongod),
+    snapshots expire after QUEUE_SNAPSHOT_TTL_SECONDS instead.
+
+    Every change to a loaded queue is also recorded in a bounded per-artist
+    log, so clients can ask for the operations since the version they hold.
+    Versions are derived from the queue's content, so once the change
+    stream has brought two workers to the same queue, either can answer.
+    Tip-ordered queues are sorted on read and report each request's rank
+    as its queue_position; a single new tip can shift every rank, so
+    they are not served as deltas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        self._artist_of: Dict[str, str] = {}
+        self._logs: Dict[str, _ChangeLog] = {}
+        self._orders: Dict[str, QueueOrder] = {}
+        # Changes seen while a snapshot is being read from MongoDB
+        self._loading: Dict[str, List[Tuple[str, Any]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stream_healthy = False
+
+    def _fresh(self, artist_username: str) -> bool:
+        if self.stream_healthy:
+            return True
+        age = time.monotonic() - self._loaded_at.get(artist_username, 0)
+        return age < settings.QUEUE_SNAPSHOT_TTL_SECONDS
+
+    def get(self, artist_username: str) -> Optional[List[Dict]]:
+        """Pending requests for an artist in queue order, or None if not loaded"""
+        versioned = self.get_versioned(artist_username)
+        return versioned[1] if versioned else None
+
+    def get_versioned(self, artist_username: str) -> Optional[Tuple[str, List[Dict]]]:
+        """The queue version and pending requests in queue order, or None if not loaded"""
+        with self._lock:
+            queue = self._queues.get(artist_username)
+            if queue is None or not self._fresh(artist_username):
+                return None
+            self._queues.move_to_end(artist_username)
+            version = self._logs[artist_username].version
+            if self._orders.get(artist_username) == QueueOrder.TIPS:
+                return version, rank_queue(sorted(queue.values(), key=_tip_key))
+            return version, sorted(queue.values(), key=lambda r: r["queue_position"])
+
+    def changes_since(self, artist_username: str, version: str) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        The current version and the operations applied after `version`
+
+        Returns None when the queue is not loaded or the client is too far
+        behind, in which case it needs a full snapshot.
+        """
+        with self._lock:
+            if artist_username not in self._queues or not self._fresh(artist_username):
+                return None
+            if self._orders.get(artist_username) == QueueOrder.TIPS:
+                return None
+            log = self._logs[artist_username]
+            ops = log.since(version)
+            return (log.version, ops) if ops is not None else None
+
+    def begin_load(self, artist_username: str):
+        """Start buffering stream changes for an artist whose queue is about to be read"""
+        with self._lock:
+            self._loading.setdefault(artist_username, [])
+
+    def load(self, artist_username: str, requests: List[Dict], order: QueueOrder = QueueOrder.POSITION):
+        """Replace an artist's snapshot with freshly read, expanded documents"""
+        with self._lock:
+            self._drop(artist_username)
+            self._queues[artist_username] = {str(r["_id"]): r for r in requests}
+            self._orders[artist_username] = order
+            self._loaded_at[artist_username] = time.monotonic()
+            self._logs[artist_username] = _ChangeLog(self._queues[artist_username])
+            for request_id in self._queues[artist_username]:
+                self._artist_of[request_id] = artist_username
+            while len(self._queues) > settings.QUEUE_SNAPSHOT_MAX_ARTISTS:
+                self._drop(next(iter(self._queues)))
+            buffered = self._loading.pop(artist_username, [])
+        # Replay changes that raced with the read; they are idempotent
+        for operation, value in buffered:
+            if operation == "remove":
+                self.remove(value)
+            else:
+                self.upsert(value)
+
+    def upsert(self, request: Dict):
+        """Apply the current state of an expanded request document"""
+        request_id = str(request["_id"])
+        artist_username = request["artist_username"]
+        with self._lock:
+            queue = self._queues.get(artist_username)
+            if queue is None:
+                return
+            log = self._logs[artist_username]
+            previous = queue.get(request_id)
+            if request.get("status") == "pending":
+                queue[request_id] = request
+                self._artist_of[request_id] = artist_username
+                if previous is None:
+                    log.append("added", request_id, request, request=request)
+                    return
+                if previous["queue_position"] != request["queue_position"]:
+                    log.append("moved", request_id, request, queue_position=request["queue_position"])
+                if any(previous.get(field) != request.get(field) for field in TRACK_FIELDS):
+                    log.append("updated", request_id, request, request=request)
+            elif previous is not None:
+                queue.pop(request_id)
+                self._artist_of.pop(request_id, None)
+                log.append("status_changed", request_id, None, status=request.get("status"))
+
+    def remove(self, request_id: str):
+        with self._lock:
+            artist_username = self._artist_of.pop(request_id, None)
+            if artist_username in self._queues:
+                if self._queues[artist_username].pop(request_id, None) is not None:
+                    self._logs[artist_username].append("removed", request_id, None)
+
+    def shift_after(self, artist_username: str, position: int, delta: int = -1):
+        """Mirror the renumbering update_many applied after a removal"""
+        with self._lock:
+            for request_id, request in self._queues.get(artist_username, {}).items():
+                if request["queue_position"] > position:
+                    request["queue_position"] += delta
+                    self._logs[artist_username].append(
+                        "moved", request_id, request, queue_position=request["queue_position"]
+                    )
+
+    def set_positions(self, artist_username: str, positions: Dict[str, int]):
+        with self._lock:
+            queue = self._queues.get(artist_username, {})
+            for request_id, position in positions.items():
+                if request_id in queue and queue[request_id]["queue_position"] != position:
+                    queue[request_id]["queue_position"] = position
+                    self._logs[artist_username].append("moved", request_id, queue[request_id], queue_position=position)
+
+    def set_status(self, artist_username: str, status: str, request_ids: Optional[List[str]] = None):
+        """Take requests (all of them if request_ids is None) out of the pending queue"""
+        with self._lock:
+            queue = self._queues.get(artist_username)
+            if queue is None:
+                return
+            ids = list(queue) if request_ids is None else [i for i in request_ids if i in queue]
+            for request_id in ids:
+                queue.pop(request_id)
+                self._artist_of.pop(request_id, None)
+                self._logs[artist_username].append("status_changed", request_id, None, status=status)
+
+    def invalidate(self, artist_username: Optional[str] = None):
+        """Discard one artist's snapshot, or all of them"""
+        with self._lock:
+            if artist_username is None:
+                self._queues.clear()
+                self._loaded_at.clear()
+                self._artist_of.clear()
+                self._logs.clear()
+                self._orders.clear()
+                self._loading.clear()
+            else:
+                self._drop(artist_username)
+
+    def _drop(self, artist_username: str):
+        for request_id in self._queues.pop(artist_username, {}):
+            self._artist_of.pop(request_id, None)
+        self._loaded_at.pop(artist_username, None)
+        self._logs.pop(artist_username, None)
+        self._orders.pop(artist_username, None)
+
+    def _apply_change(self, change: Dict):
+        if change["ns"]["coll"] == "artists":
+            # The artist switched queue order; reload with the new one
+            artist = change.get("fullDocument")
+            if artist is not None:
+                self.invalidate(artist["username"])
+            return
+        request = change.get("fullDocument")
+        if change["operationType"] == "delete" or request is None:
+            # A missing fullDocument means it was deleted before the lookup
+            request_id = str(change["documentKey"]["_id"])
+            with self._lock:
+                for buffered in self._loading.values():
+                    buffered.append(("remove", request_id))
+            self.remove(request_id)
+            return
+        artist_username = request["artist_username"]
+        if artist_username not in self._queues and artist_username not in self._loading:
+            return
+        tracks = track_store.get_many([request.get("spotify_track_id")])
+        request = track_store.expand_request(request, tracks.get(request.get("spotify_track_id")))
+        if request.get("status") == "pending":
+            # MongoDB positions trail the queue store's until they are persisted
+            request = get_queue_store().with_live_positions(artist_username, [request])[0]
+        with self._lock:
+            if artist_username in self._loading:
+                self._loading[artist_username].append(("upsert", request))
+                return
+        self.upsert(request)
+
+    def _watch(self):
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": "requests", "operationType": {"$in": ["insert", "update", "replace", "delete"]}},
+            {"ns.coll": "artists", "operationType": "update",
+             "updateDescription.updatedFields.queue_order": {"$exists": True}},
+        ]}}]
+        while not self._stop.is_set():
+            db = get_database()
+            try:
+                with db.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+                    # Anything cached before the stream opened may have missed changes
+                    self.invalidate()
+                    self.stream_healthy = True
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._apply_change(change)
+            except (OperationFailure, NotImplementedError) as e:
+                # Change streams need a replica set; fall back to TTL expiry
+                logger.warning("Queue change stream unavailable, using %ss snapshot TTL: %s",
+                               settings.QUEUE_SNAPSHOT_TTL_SECONDS, e)
+                self.stream_healthy = False
+                self.invalidate()
+                return
+            except PyMongoError as e:
+                logger.warning("Queue change stream dropped, resyncing: %s", e)
+                self.stream_healthy = False
+                self.invalidate()
+                self._stop.wait(1)
+            except Exception:
+                logger.exception("Queue change stream failed, using %ss snapshot TTL",
+                                 settings.QUEUE_SNAPSHOT_TTL_SECONDS)
+                self.stream_healthy = False
+                self.invalidate()
+                return
+
+    def start(self):
+        """Start following the requests/artists change stream in a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="queue-change-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.stream_healthy = False
+
+
+# Global instance
+queue_snapshots = QueueSnapshots()
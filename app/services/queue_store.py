@@ -0,0 +1,444 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+from app.config import settings
+from app.database import get_database
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+
+class QueueStore(ABC):
+    """
+    Where the order of each artist's pending queue is kept
+
+    Routers create and update request documents in MongoDB as before, but
+    every change to pending-queue positions goes through the store.
+    Positions are dense: removing a request moves every later one up.
+    """
+
+    @abstractmethod
+    def next_position(self, artist_username: str) -> int:
+        """Position for a request appended to the queue"""
+
+    @abstractmethod
+    def add(self, artist_username: str, request_id: str, position: int):
+        """Record a request inserted at the end of the queue"""
+
+    @abstractmethod
+    def remove(self, artist_username: str, request_id: str, position: int) -> Optional[int]:
+        """Take a request out of the queue; returns the position it held, if it was queued"""
+
+    @abstractmethod
+    def remove_many(self, artist_username: str, request_ids: List[str]) -> Dict[str, int]:
+        """Take requests out of the queue; returns the new positions of the requests that moved"""
+
+    @abstractmethod
+    def clear(self, artist_username: str):
+        """Forget the whole queue after every pending request was closed"""
+
+    @abstractmethod
+    def move(self, artist_username: str, positions: Dict[str, int]) -> Dict[str, int]:
+        """
+        Move requests to new positions; returns the new positions of the requests that moved
+
+        A reorder sends the new position of every request it touches. The
+        MongoDB store writes them as given; the Redis store inserts each
+        request at its position and shifts the others, so its queue stays dense.
+        """
+
+    @abstractmethod
+    def complete_head(self, artist_username: str) -> Optional[Dict]:
+        """Atomically mark the first request completed and return it, or None if the queue is empty"""
+
+    @abstractmethod
+    def first(self, artist_username: str) -> Optional[Dict]:
+        """The request document at the head of the queue"""
+
+    def positions(self, artist_username: str) -> Optional[Dict[str, int]]:
+        """Live positions by request ID when they may be ahead of MongoDB, else None"""
+        return None
+
+    def with_live_positions(self, artist_username: str, requests_data: List[Dict]) -> List[Dict]:
+        """Apply the live positions, which may be ahead of MongoDB, in queue order"""
+        positions = self.positions(artist_username)
+        if positions is None:
+            return requests_data
+        for request_data in requests_data:
+            request_data["queue_position"] = positions.get(str(request_data["_id"]), request_data["queue_position"])
+        return sorted(requests_data, key=lambda r: r["queue_position"])
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class MongoQueueStore(QueueStore):
+    """Positions are the queue_position fields of the request documents"""
+
+    def next_position(self, artist_username: str) -> int:
+        last_request = get_database().requests.find_one(
+            {"artist_username": artist_username, "status": PENDING},
+            sort=[("queue_position", -1)]
+        )
+        return (last_request["queue_position"] + 1) if last_request else 1
+
+    def add(self, artist_username: str, request_id: str, position: int):
+        # The document was inserted with its position; nothing else to record
+        pass
+
+    def remove(self, artist_username: str, request_id: str, position: int) -> Optional[int]:
+        # Move all requests with higher positions down by 1
+        get_database().requests.update_many(
+            {"artist_username": artist_username, "queue_position": {"$gt": position}, "status": PENDING},
+            {"$inc": {"queue_position": -1}}
+        )
+        return position
+
+    def remove_many(self, artist_username: str, request_ids: List[str]) -> Dict[str, int]:
+        # Renumber what is left in one read and one bulk write, touching only moved requests
+        db = get_database()
+        pending = db.requests.find(
+            {"artist_username": artist_username, "status": PENDING},
+            {"queue_position": 1}
+        ).sort("queue_position", 1)
+        positions = {}
+        updates = []
+        for position, request_data in enumerate(pending, 1):
+            if request_data["queue_position"] != position:
+                positions[str(request_data["_id"])] = position
+                updates.append(UpdateOne({"_id": request_data["_id"]}, {"$set": {"queue_position": position}}))
+        if updates:
+            db.requests.bulk_write(updates, ordered=False)
+        return positions
+
+    def clear(self, artist_username: str):
+        # Closed requests leave the queue with their status change
+        pass
+
+    def move(self, artist_username: str, positions: Dict[str, int]) -> Dict[str, int]:
+        if not positions:
+            return {}
+        now = datetime.utcnow()
+        get_database().requests.bulk_write([
+            UpdateOne({"_id": ObjectId(request_id)}, {"$set": {"queue_position": position, "updated_at": now}})
+            for request_id, position in positions.items()
+        ], ordered=False)
+        return positions
+
+    def complete_head(self, artist_username: str) -> Optional[Dict]:
+        completed = get_database().requests.find_one_and_update(
+            {"artist_username": artist_username, "status": PENDING},
+            {"$set": {"status": "completed", "updated_at": datetime.utcnow()}},
+            sort=[("queue_position", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if completed:
+            self.remove(artist_username, str(completed["_id"]), completed["queue_position"])
+        return completed
+
+    def first(self, artist_username: str) -> Optional[Dict]:
+        return get_database().requests.find_one(
+            {"artist_username": artist_username, "status": PENDING},
+            sort=[("queue_position", 1)]
+        )
+
+
+class RedisQueueStore(QueueStore):
+    """
+    Pending queues in Redis sorted sets, persisted to MongoDB in the background
+
+    Each artist has a ZSET of pending request IDs whose rank is the queue
+    position, so position lookups, removals and moves are O(log n) and
+    never renumber anything. Appends take their score from a per-artist
+    counter, and moves take the midpoint of their new neighbours' scores;
+    a reorder is applied in a single WATCH/MULTI transaction on the queue.
+    Completing the head marks the document in MongoDB before the ZSET
+    changes, so a failed write never drops a request from the queue.
+    A hash holds the position last written to MongoDB for each request.
+    Artists whose positions changed are put in a dirty set, and a
+    background thread writes only the positions that differ, every
+    QUEUE_PERSIST_INTERVAL_SECONDS. A queue is loaded from MongoDB the
+    first time it is touched.
+    """
+
+    DIRTY_KEY = "queue:dirty"
+    # Sentinel field marking a queue as loaded, even when it is empty
+    LOADED_FIELD = "_loaded"
+
+    def __init__(self, client=None):
+        # Imported here so deployments on the MongoDB store never load redis
+        import redis
+
+        self._watch_error = redis.WatchError
+        self._redis_error = redis.RedisError
+        self.redis = client if client is not None else redis.Redis.from_url(
+            settings.REDIS_URL, decode_responses=True
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _queue_key(artist_username: str) -> str:
+        return f"queue:{artist_username}"
+
+    @staticmethod
+    def _persisted_key(artist_username: str) -> str:
+        return f"queue:{artist_username}:persisted"
+
+    @staticmethod
+    def _seq_key(artist_username: str) -> str:
+        return f"queue:{artist_username}:seq"
+
+    def _ensure_loaded(self, artist_username: str):
+        persisted_key = self._persisted_key(artist_username)
+        if self.redis.exists(persisted_key):
+            return
+        with self.redis.pipeline() as pipe:
+            try:
+                # Another instance loading the same queue makes EXEC fail; its copy wins
+                pipe.watch(persisted_key)
+                pending = list(get_database().requests.find(
+                    {"artist_username": artist_username, "status": PENDING},
+                    {"queue_position": 1}
+                ).sort("queue_position", 1))
+                pipe.multi()
+                pipe.delete(self._queue_key(artist_username))
+                if pending:
+                    pipe.zadd(self._queue_key(artist_username), {
+                        str(request_data["_id"]): score for score, request_data in enumerate(pending, 1)
+                    })
+                pipe.set(self._seq_key(artist_username), len(pending))
+                pipe.hset(persisted_key, mapping={
+                    self.LOADED_FIELD: 1,
+                    **{str(request_data["_id"]): request_data["queue_position"] for request_data in pending},
+                })
+                pipe.execute()
+            except self._watch_error:
+                pass
+
+    def _order(self, artist_username: str) -> List[str]:
+        return self.redis.zrange(self._queue_key(artist_username), 0, -1)
+
+    def _changed(self, before: List[str], after: List[str]) -> Dict[str, int]:
+        old = {request_id: position for position, request_id in enumerate(before, 1)}
+        return {
+            request_id: position
+            for position, request_id in enumerate(after, 1)
+            if old.get(request_id) != position
+        }
+
+    def next_position(self, artist_username: str) -> int:
+        self._ensure_loaded(artist_username)
+        return self.redis.zcard(self._queue_key(artist_username)) + 1
+
+    def add(self, artist_username: str, request_id: str, position: int):
+        self._ensure_loaded(artist_username)
+        score = self.redis.incr(self._seq_key(artist_username))
+        with self.redis.pipeline() as pipe:
+            pipe.zadd(self._queue_key(artist_username), {request_id: score})
+            # The document was inserted with this position
+            pipe.hset(self._persisted_key(artist_username), request_id, position)
+            pipe.execute()
+
+    def remove(self, artist_username: str, request_id: str, position: int) -> Optional[int]:
+        self._ensure_loaded(artist_username)
+        rank = self.redis.zrank(self._queue_key(artist_username), request_id)
+        if rank is None:
+            return None
+        with self.redis.pipeline() as pipe:
+            pipe.zrem(self._queue_key(artist_username), request_id)
+            pipe.hdel(self._persisted_key(artist_username), request_id)
+            pipe.sadd(self.DIRTY_KEY, artist_username)
+            pipe.execute()
+        return rank + 1
+
+    def remove_many(self, artist_username: str, request_ids: List[str]) -> Dict[str, int]:
+        self._ensure_loaded(artist_username)
+        before = self._order(artist_username)
+        with self.redis.pipeline() as pipe:
+            pipe.zrem(self._queue_key(artist_username), *request_ids)
+            pipe.hdel(self._persisted_key(artist_username), *request_ids)
+            pipe.sadd(self.DIRTY_KEY, artist_username)
+            pipe.execute()
+        return self._changed(before, self._order(artist_username))
+
+    def clear(self, artist_username: str):
+        with self.redis.pipeline() as pipe:
+            pipe.delete(self._queue_key(artist_username), self._persisted_key(artist_username))
+            pipe.hset(self._persisted_key(artist_username), self.LOADED_FIELD, 1)
+            pipe.execute()
+
+    def move(self, artist_username: str, positions: Dict[str, int]) -> Dict[str, int]:
+        self._ensure_loaded(artist_username)
+        queue_key = self._queue_key(artist_username)
+        seq_key = self._seq_key(artist_username)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    # The queue is read and rewritten in one transaction; a concurrent change retries it
+                    pipe.watch(queue_key, seq_key)
+                    members = pipe.zrange(queue_key, 0, -1, withscores=True)
+                    seq = float(pipe.get(seq_key) or 0)
+                    before = [request_id for request_id, _ in members]
+                    order, scores, seq = self._plan_moves(members, seq, positions)
+                    pipe.multi()
+                    if scores:
+                        pipe.zadd(queue_key, scores)
+                    pipe.set(seq_key, int(seq))
+                    pipe.sadd(self.DIRTY_KEY, artist_username)
+                    pipe.execute()
+                    return self._changed(before, order)
+                except self._watch_error:
+                    continue
+
+    @staticmethod
+    def _plan_moves(members: List, seq: float, positions: Dict[str, int]):
+        """
+        Apply moves to a copy of the queue; returns the new order, the scores to write and the counter
+
+        Each request is inserted at its position with the midpoint of its
+        new neighbours' scores. When midpoints run out of precision the
+        whole queue is respaced to 1..n and every score is rewritten.
+        """
+        queue = [[request_id, score] for request_id, score in members]
+        changed: Dict[str, float] = {}
+        respaced = False
+        for request_id, position in sorted(positions.items(), key=lambda item: item[1]):
+            index = next((i for i, member in enumerate(queue) if member[0] == request_id), None)
+            if index is None:
+                continue
+            member = queue.pop(index)
+            rank = min(max(position - 1, 0), len(queue))
+            previous = queue[rank - 1][1] if rank > 0 else None
+            following = queue[rank][1] if rank < len(queue) else None
+            if previous is not None and following is not None and following - previous < 1e-6:
+                for score, other in enumerate(queue, 1):
+                    other[1] = float(score)
+                seq = float(len(queue) + 1)
+                respaced = True
+                previous = queue[rank - 1][1] if rank > 0 else None
+                following = queue[rank][1] if rank < len(queue) else None
+            if following is None:
+                seq = max(seq, previous or 0) + 1
+                member[1] = seq
+            elif previous is None:
+                member[1] = following - 1
+            else:
+                member[1] = (previous + following) / 2
+            queue.insert(rank, member)
+            changed[request_id] = member[1]
+        if respaced:
+            changed = {request_id: score for request_id, score in queue}
+        return [request_id for request_id, _ in queue], changed, seq
+
+    def complete_head(self, artist_username: str) -> Optional[Dict]:
+        self._ensure_loaded(artist_username)
+        db = get_database()
+        while True:
+            head = self.redis.zrange(self._queue_key(artist_username), 0, 0)
+            if not head:
+                return None
+            request_id = head[0]
+            # MongoDB decides which caller completes the head; the ZSET is only
+            # changed afterwards, so a failed write leaves the queue intact
+            completed = db.requests.find_one_and_update(
+                {"_id": ObjectId(request_id), "status": PENDING},
+                {"$set": {"status": "completed", "updated_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            # Completed here, or already closed by someone else: either way it leaves the queue
+            with self.redis.pipeline() as pipe:
+                pipe.zrem(self._queue_key(artist_username), request_id)
+                pipe.hdel(self._persisted_key(artist_username), request_id)
+                pipe.sadd(self.DIRTY_KEY, artist_username)
+                pipe.execute()
+            if completed:
+                completed["queue_position"] = 1
+                return completed
+
+    def first(self, artist_username: str) -> Optional[Dict]:
+        self._ensure_loaded(artist_username)
+        head = self.redis.zrange(self._queue_key(artist_username), 0, 0)
+        if not head:
+            return None
+        request_data = get_database().requests.find_one({"_id": ObjectId(head[0])})
+        if request_data:
+            request_data["queue_position"] = 1
+        return request_data
+
+    def positions(self, artist_username: str) -> Optional[Dict[str, int]]:
+        self._ensure_loaded(artist_username)
+        return {request_id: position for position, request_id in enumerate(self._order(artist_username), 1)}
+
+    def persist(self, artist_username: str):
+        """Write the positions that changed since the last flush to MongoDB"""
+        persisted_key = self._persisted_key(artist_username)
+        persisted = self.redis.hgetall(persisted_key)
+        changed = {
+            request_id: position
+            for position, request_id in enumerate(self._order(artist_username), 1)
+            if persisted.get(request_id) != str(position)
+        }
+        if not changed:
+            return
+        get_database().requests.bulk_write([
+            UpdateOne({"_id": ObjectId(request_id), "status": PENDING}, {"$set": {"queue_position": position}})
+            for request_id, position in changed.items()
+        ], ordered=False)
+        self.redis.hset(persisted_key, mapping=changed)
+
+    def _run(self):
+        while not self._stop.wait(settings.QUEUE_PERSIST_INTERVAL_SECONDS):
+            self.flush()
+
+    def flush(self):
+        """Persist every dirty queue"""
+        while True:
+            try:
+                artist_username = self.redis.spop(self.DIRTY_KEY)
+            except self._redis_error as e:
+                logger.warning("Queue persistence paused, Redis unavailable: %s", e)
+                return
+            if artist_username is None:
+                return
+            try:
+                self.persist(artist_username)
+            except (PyMongoError, self._redis_error) as e:
+                logger.warning("Persisting queue for %s failed, will retry: %s", artist_username, e)
+                self.redis.sadd(self.DIRTY_KEY, artist_username)
+                return
+
+    def start(self):
+        """Start persisting queue positions to MongoDB in a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="queue-persist", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        # Write out what is left before shutting down
+        self.flush()
+
+
+# Global instance, created on first use
+_queue_store: Optional[QueueStore] = None
+
+def get_queue_store() -> QueueStore:
+    """Get the queue store selected by QUEUE_BACKEND, creating it on first use"""
+    global _queue_store
+    if _queue_store is None:
+        _queue_store = RedisQueueStore() if settings.QUEUE_BACKEND == "redis" else MongoQueueStore()
+    return _queue_store
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is backing off or failing"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Upstream unavailable, retry after {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Shared backoff window plus a consecutive-failure circuit breaker
+
+    `backoff()` opens a window (from a Retry-After header) during which no
+    call is attempted. After `failure_threshold` consecutive failures the
+    circuit opens for `reset_seconds`; then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._blocked_until = 0.0
+        self._opened_until = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        now = time.monotonic()
+        if self._failures < self.failure_threshold:
+            return "backoff" if now < self._blocked_until else "closed"
+        return "open" if now < self._opened_until else "half-open"
+
+    def before_call(self):
+        """Raise CircuitOpenError if a call must not be attempted right now"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._blocked_until, self._opened_until) - now
+            if wait > 0:
+                raise CircuitOpenError(wait)
+            if self._failures >= self.failure_threshold:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(self.reset_seconds)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_until = time.monotonic() + self.reset_seconds
+
+    def cancel_call(self):
+        """Forget a call that was abandoned for reasons unrelated to the upstream's health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def backoff(self, seconds: float):
+        """Stop all calls for `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self._trial_in_flight = False
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_after": round(max(self._blocked_until, self._opened_until, now) - now, 1),
+        }
+
+
+class StaleCache:
+    """
+    Bounded LRU cache whose entries go stale after `ttl` and expire after `stale_ttl`
+
+    `get` returns the value together with a flag telling whether it is
+    stale, so callers can serve it while they revalidate.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Tuple[Optional[Any], bool]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None, False
+            age = time.monotonic() - item[0]
+            if age > self.stale_ttl:
+                del self._entries[key]
+                return None, False
+            self._entries.move_to_end(key)
+            return item[1], age > self.ttl
+
+    def set(self, key: Hashable, value: Any, age: float = 0):
+        """Store a value that is already `age` seconds old"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() - age, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
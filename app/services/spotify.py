@@ -1,22 +1,175 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import os
-from typing import List, Dict, Optional
+import re
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Optional, Callable
 from fastapi import HTTPException, status
+from app.config import settings
+from app import deadlines
+from app.deadlines import DeadlineExceeded
+from app.services.tracks import track_store
+from app.services.cache import cache
+from app.services.resilience import CircuitBreaker, CircuitOpenError
+from app.timing import phase
+
+if TYPE_CHECKING:
+    import spotipy
+
+logger = logging.getLogger(__name__)
+
+# Spotify's multi-track endpoint accepts up to 50 IDs per call
+TRACKS_PER_CALL = 50
+SPOTIFY_ID = re.compile(r"^[0-9A-Za-z]{22}$")
+
+def _deadline_session():
+    """A requests session whose timeouts never outlast the current request's deadline"""
+    import requests
+    
+    class DeadlineSession(requests.Session):
+        def request(self, method, url, **kwargs):
+            kwargs["timeout"] = deadlines.clamp_timeout(kwargs.get("timeout"), "spotify")
+            return super().request(method, url, **kwargs)
+    
+    return DeadlineSession()
 
 class SpotifyService:
-    def __init__(self):
-        client_id = os.getenv("SPOTIFY_CLIENT_ID")
-        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+    def __init__(self, client: Optional["spotipy.Spotify"] = None):
+        # spotipy (and requests/redis through it) is imported here rather than
+        # at module level so processes that never call Spotify don't load it
+        import requests
+        import spotipy
+        from spotipy.oauth2 import SpotifyClientCredentials
+        
+        self._spotify_error = spotipy.exceptions.SpotifyException
+        self._request_error = requests.exceptions.RequestException
         
-        if not client_id or not client_secret:
-            raise ValueError("Spotify credentials not found in environment variables")
+        if client is None:
+            client_id = os.getenv("SPOTIFY_CLIENT_ID")
+            client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+            
+            if not client_id or not client_secret:
+                raise ValueError("Spotify credentials not found in environment variables")
+            
+            timeout = (settings.SPOTIFY_CONNECT_TIMEOUT_SECONDS, settings.SPOTIFY_TIMEOUT_SECONDS)
+            client_credentials_manager = SpotifyClientCredentials(
+                client_id=client_id,
+                client_secret=client_secret,
+                requests_session=_deadline_session(),
+                requests_timeout=timeout
+            )
+            # A plain session disables spotipy's built-in retries, which would
+            # sleep through Retry-After while holding up the request
+            client = spotipy.Spotify(
+                client_credentials_manager=client_credentials_manager,
+                requests_session=_deadline_session(),
+                requests_timeout=timeout
+            )
+        self.sp = client
         
-        client_credentials_manager = SpotifyClientCredentials(
-            client_id=client_id,
-            client_secret=client_secret
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.SPOTIFY_BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=settings.SPOTIFY_BREAKER_RESET_SECONDS
+        )
+        # Shared with other instances when the cache has a Redis tier
+        self.search_cache = cache.namespace(
+            "spotify_search",
+            ttl=settings.SPOTIFY_SEARCH_CACHE_TTL_SECONDS,
+            stale_ttl=settings.SPOTIFY_STALE_TTL_SECONDS,
+            max_entries=settings.SPOTIFY_CACHE_MAX_ENTRIES
+        )
+        # Fresh track details, in front of the tracks collection
+        self.track_cache = cache.namespace("tracks", ttl=settings.TRACK_MEMORY_CACHE_TTL_SECONDS)
+        # Background revalidation of stale entries
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="spotify-refresh")
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+    
+    def token_status(self) -> Dict:
+        """Report whether a Spotify access token is cached and how long it stays valid"""
+        circuit = self.breaker.snapshot()
+        auth_manager = self.sp.auth_manager
+        token_info = auth_manager.cache_handler.get_cached_token() if auth_manager else None
+        if not token_info:
+            return {"token_cached": False, "expires_in": 0, "circuit": circuit}
+        return {
+            "token_cached": True,
+            "expires_in": max(int(token_info["expires_at"] - time.time()), 0),
+            "circuit": circuit
+        }
+    
+    def _call(self, fn: Callable, *args, **kwargs):
+        """
+        Call the Spotify API through the circuit breaker
+        
+        A 429 opens the shared backoff window for its Retry-After period;
+        5xx responses, timeouts and connection errors count as failures.
+        Raises CircuitOpenError without calling Spotify while either is active,
+        and DeadlineExceeded when the request's budget runs out; that says
+        nothing about Spotify's health, so it does not count as a failure.
+        """
+        deadlines.check("spotify")
+        self.breaker.before_call()
+        try:
+            with phase("spotify"):
+                result = fn(*args, **kwargs)
+        except DeadlineExceeded:
+            self.breaker.cancel_call()
+            raise
+        except self._spotify_error as e:
+            if e.http_status == 429:
+                retry_after = (e.headers or {}).get("Retry-After")
+                try:
+                    retry_after = float(retry_after)
+                except (TypeError, ValueError):
+                    retry_after = settings.SPOTIFY_BREAKER_RESET_SECONDS
+                self.breaker.backoff(retry_after)
+                logger.warning("Spotify rate limited, backing off for %.0fs", retry_after)
+            elif e.http_status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except (self._request_error, OSError):
+            if deadlines.expired():
+                # Timed out because the request's budget ran out
+                self.breaker.cancel_call()
+                deadlines.check("spotify")
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+    
+    def _revalidate(self, key, refresh: Callable):
+        """Refresh a stale entry in the background unless Spotify is backing off"""
+        if self.breaker.state in ("backoff", "open"):
+            return
+        # Request threads race here; only the first one for a key schedules a refresh
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                logger.info("Background Spotify refresh failed: %s", e)
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+        
+        self._refresher.submit(run)
+    
+    @staticmethod
+    def _unavailable(e: Exception, retry_after: Optional[float] = None) -> HTTPException:
+        headers = {"Retry-After": str(max(int(retry_after), 1))} if retry_after else None
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Spotify API error: {str(e)}",
+            headers=headers
         )
-        self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
     
     def search_tracks(self, query: str, limit: int = 20) -> List[Dict]:
         """
@@ -27,91 +180,58 @@ class SpotifyService:
             limit: Maximum number of results to return (default: 20, max: 50)
             
         Returns:
-            List of track dictionaries with simplified structure
+            List of track dictionaries with simplified structure. Results
+            served from cache while Spotify is unavailable have 'stale' set.
         """
+        # Limit the search to a reasonable number
+        limit = min(limit, 50)
+        key = f"{limit}:{query.lower()}"
+        
+        cached, is_stale = self.search_cache.get(key)
+        if cached is not None and not is_stale:
+            return cached
+        if cached is not None:
+            # Serve the stale copy now and refresh it in the background
+            self._revalidate(key, lambda: self._search_upstream(query, limit))
+            return [{**track, 'stale': True} for track in cached]
+        
         try:
-            # Limit the search to a reasonable number
-            limit = min(limit, 50)
-            
-            results = self.sp.search(q=query, type='track', limit=limit)
-            tracks = results['tracks']['items']
-            
-            simplified_tracks = []
-            for track in tracks:
-                # Get the first artist name (primary artist)
-                artist_name = track['artists'][0]['name'] if track['artists'] else 'Unknown Artist'
-                
-                # Get all artist names for display
-                all_artists = ', '.join([artist['name'] for artist in track['artists']])
-                
-                # Get album art (use the smallest available image)
-                album_image = None
-                if track['album']['images']:
-                    # Sort by size and get the smallest image
-                    images = sorted(track['album']['images'], key=lambda x: x['width'])
-                    album_image = images[0]['url']
-                
-                simplified_track = {
-                    'id': track['id'],
-                    'name': track['name'],
-                    'artist': artist_name,
-                    'all_artists': all_artists,
-                    'album': track['album']['name'],
-                    'album_image': album_image,
-                    'preview_url': track['preview_url'],
-                    'external_url': track['external_urls']['spotify'],
-                    'duration_ms': track['duration_ms'],
-                    'popularity': track['popularity']
-                }
-                simplified_tracks.append(simplified_track)
-            
-            return simplified_tracks
-            
-        except spotipy.exceptions.SpotifyException as e:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Spotify API error: {str(e)}"
-            )
+            return self._search_upstream(query, limit)
+        except CircuitOpenError as e:
+            raise self._unavailable(e, e.retry_after)
+        except self._spotify_error as e:
+            raise self._unavailable(e, self.breaker.snapshot()["retry_after"])
+        except self._request_error as e:
+            raise self._unavailable(e)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error searching tracks: {str(e)}"
             )
     
-    def get_track(self, track_id: str) -> Optional[Dict]:
-        """
-        Get detailed information about a specific track
+    def _search_upstream(self, query: str, limit: int) -> List[Dict]:
+        """Run a search against Spotify and cache the simplified results"""
+        results = self._call(self.sp.search, q=query, type='track', limit=limit)
+        tracks = results['tracks']['items']
         
-        Args:
-            track_id: Spotify track ID
-            
-        Returns:
-            Track dictionary with detailed information or None if not found
-        """
-        try:
-            track = self.sp.track(track_id)
-            
-            if not track:
-                return None
-            
+        simplified_tracks = []
+        for track in tracks:
             # Get the first artist name (primary artist)
             artist_name = track['artists'][0]['name'] if track['artists'] else 'Unknown Artist'
             
             # Get all artist names for display
             all_artists = ', '.join([artist['name'] for artist in track['artists']])
             
-            # Get album art (use the medium size if available)
+            # Get album art (use the smallest available image)
             album_image = None
             if track['album']['images']:
-                # Try to get medium size image, fallback to first available
-                for image in track['album']['images']:
-                    if image['width'] >= 300:
-                        album_image = image['url']
-                        break
-                if not album_image:
-                    album_image = track['album']['images'][0]['url']
+                # Sort by size and get the smallest image
+                images = sorted(track['album']['images'], key=lambda x: x['width'])
+                album_image = images[0]['url']
             
-            return {
+            simplified_track = {
                 'id': track['id'],
                 'name': track['name'],
                 'artist': artist_name,
@@ -121,20 +241,166 @@ class SpotifyService:
                 'preview_url': track['preview_url'],
                 'external_url': track['external_urls']['spotify'],
                 'duration_ms': track['duration_ms'],
-                'popularity': track['popularity'],
-                'release_date': track['album']['release_date']
+                'popularity': track['popularity']
             }
+            simplified_tracks.append(simplified_track)
+        
+        self.search_cache.set(f"{limit}:{query.lower()}", simplified_tracks)
+        return simplified_tracks
+    
+    def get_track(self, track_id: str) -> Optional[Dict]:
+        """
+        Get detailed information about a specific track
+        
+        Args:
+            track_id: Spotify track ID
             
-        except spotipy.exceptions.SpotifyException as e:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Spotify API error: {str(e)}"
-            )
+        Returns:
+            Track dictionary with detailed information or None if not found
+        """
+        cached, _ = self.track_cache.get(track_id)
+        if cached:
+            return cached
+        cached, is_stale = track_store.get_cached(track_id)
+        if cached and not is_stale:
+            self.track_cache.set(track_id, cached)
+            return cached
+        if cached:
+            # Serve the stale copy now and refresh it in the background
+            self._revalidate(("track", track_id), lambda: self._get_track_upstream(track_id))
+            return {**cached, 'stale': True}
+        
+        try:
+            return self._get_track_upstream(track_id)
+        except CircuitOpenError as e:
+            raise self._unavailable(e, e.retry_after)
+        except self._spotify_error as e:
+            raise self._unavailable(e, self.breaker.snapshot()["retry_after"])
+        except self._request_error as e:
+            raise self._unavailable(e)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error getting track: {str(e)}"
             )
+    
+    def _get_track_upstream(self, track_id: str) -> Optional[Dict]:
+        """Fetch a track from Spotify and store its details"""
+        track = self._call(self.sp.track, track_id)
+        
+        if not track:
+            return None
+        
+        track_details = self._track_details(track)
+        track_store.save(track_details)
+        self.track_cache.set(track_id, track_details)
+        return track_details
+    
+    def get_tracks(self, track_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Get details for several tracks, using the multi-track API for cache misses
+        
+        Args:
+            track_ids: Spotify track IDs
+            
+        Returns:
+            Track details by ID; None for IDs Spotify does not know
+        """
+        ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+        found: Dict[str, Optional[Dict]] = {
+            track_id: track for track_id, (track, _) in self.track_cache.get_many(ids).items()
+        }
+        cached = track_store.get_cached_many(track_id for track_id in ids if track_id not in found)
+        missing = []
+        for track_id in ids:
+            if track_id in found:
+                continue
+            if track_id in cached and not cached[track_id][1]:
+                found[track_id] = cached[track_id][0]
+                self.track_cache.set(track_id, found[track_id])
+            elif SPOTIFY_ID.match(track_id):
+                missing.append(track_id)
+            else:
+                # Malformed IDs would fail the whole batch upstream
+                found[track_id] = None
+        
+        try:
+            for start in range(0, len(missing), TRACKS_PER_CALL):
+                chunk = missing[start:start + TRACKS_PER_CALL]
+                results = self._call(self.sp.tracks, chunk)['tracks']
+                for track_id, track in zip(chunk, results):
+                    if track:
+                        found[track_id] = self._track_details(track)
+                        track_store.save(found[track_id])
+                        self.track_cache.set(track_id, found[track_id])
+                    else:
+                        found[track_id] = None
+        except CircuitOpenError as e:
+            raise self._unavailable(e, e.retry_after)
+        except self._spotify_error as e:
+            raise self._unavailable(e, self.breaker.snapshot()["retry_after"])
+        except self._request_error as e:
+            raise self._unavailable(e)
+        return found
+    
+    @staticmethod
+    def _track_details(track: Dict) -> Dict:
+        """Simplify a full track object from the Spotify API"""
+        # Get the first artist name (primary artist)
+        artist_name = track['artists'][0]['name'] if track['artists'] else 'Unknown Artist'
+        
+        # Get all artist names for display
+        all_artists = ', '.join([artist['name'] for artist in track['artists']])
+        
+        # Get album art (use the medium size if available)
+        album_image = None
+        if track['album']['images']:
+            # Try to get medium size image, fallback to first available
+            for image in track['album']['images']:
+                if image['width'] >= 300:
+                    album_image = image['url']
+                    break
+            if not album_image:
+                album_image = track['album']['images'][0]['url']
+        
+        return {
+            'id': track['id'],
+            'name': track['name'],
+            'artist': artist_name,
+            'all_artists': all_artists,
+            'album': track['album']['name'],
+            'album_image': album_image,
+            'preview_url': track['preview_url'],
+            'external_url': track['external_urls']['spotify'],
+            'duration_ms': track['duration_ms'],
+            'popularity': track['popularity'],
+            'release_date': track['album']['release_date']
+        }
+
+    def warm_up(self):
+        """Fetch the client-credentials access token ahead of the first search"""
+        auth_manager = self.sp.auth_manager
+        if auth_manager:
+            self._call(auth_manager.get_access_token, as_dict=False)
+
+# Global instance, created on first use
+_spotify_service: Optional[SpotifyService] = None
+# The prewarm thread and the first request may both get here first
+_spotify_service_lock = threading.Lock()
+
+def get_spotify_service() -> SpotifyService:
+    """Get the shared SpotifyService, creating it on first use"""
+    global _spotify_service
+    if _spotify_service is None:
+        with _spotify_service_lock:
+            if _spotify_service is None:
+                _spotify_service = SpotifyService()
+    return _spotify_service
 
-# Global instance
-spotify_service = SpotifyService()
\ No newline at end of file
+def __getattr__(name: str):
+    # Keep `from app.services.spotify import spotify_service` working for scripts
+    if name == "spotify_service":
+        return get_spotify_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from app.config import settings
+from app.database import get_database
+
+# Request fields that live on the track document once a request references a Spotify ID
+REQUEST_TRACK_FIELDS = {
+    "spotify_track_url": "external_url",
+    "album_image_url": "album_image",
+    "preview_url": "preview_url",
+}
+
+
+class TrackStore:
+    """
+    Spotify track metadata stored once per track in the `tracks` collection
+
+    Documents are keyed by Spotify ID. A document written from the
+    Spotify API carries `fetched_at` and doubles as a persistent cache for
+    `SpotifyService.get_track`. Only Spotify writes track documents:
+    requests keep the URLs their client sent until the enrichment worker
+    has validated their ID, and only then read them from here.
+    """
+
+    def _collection(self):
+        db = get_database()
+        return db.tracks if db is not None else None
+
+    def get_cached(self, track_id: str) -> Tuple[Optional[Dict], bool]:
+        """
+        Get track details previously fetched from Spotify
+
+        Returns the details and whether they are older than
+        TRACK_CACHE_TTL_SECONDS, or (None, False) if none are stored.
+        """
+        tracks = self._collection()
+        if tracks is None:
+            return None, False
+        doc = tracks.find_one({"_id": track_id, "fetched_at": {"$exists": True}})
+        if not doc:
+            return None, False
+        max_age = timedelta(seconds=settings.TRACK_CACHE_TTL_SECONDS)
+        is_stale = datetime.utcnow() - doc.pop("fetched_at") > max_age
+        doc["id"] = doc.pop("_id")
+        return doc, is_stale
+
+    def get_cached_many(self, track_ids: Iterable[str]) -> Dict[str, Tuple[Dict, bool]]:
+        """Like get_cached for several tracks in a single query, keyed by ID"""
+        ids = list({track_id for track_id in track_ids if track_id})
+        tracks = self._collection()
+        if not ids or tracks is None:
+            return {}
+        max_age = timedelta(seconds=settings.TRACK_CACHE_TTL_SECONDS)
+        now = datetime.utcnow()
+        found = {}
+        for doc in tracks.find({"_id": {"$in": ids}, "fetched_at": {"$exists": True}}):
+            is_stale = now - doc.pop("fetched_at") > max_age
+            doc["id"] = doc.pop("_id")
+            found[doc["id"]] = (doc, is_stale)
+        return found
+
+    def save(self, track: Dict):
+        """Store full track details fetched from Spotify"""
+        tracks = self._collection()
+        if tracks is None:
+            return
+        doc = {k: v for k, v in track.items() if k != "id" and v is not None}
+        doc["fetched_at"] = datetime.utcnow()
+        tracks.update_one({"_id": track["id"]}, {"$set": doc}, upsert=True)
+
+    def get_many(self, track_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Get track documents for a set of Spotify IDs in a single query"""
+        ids = list({track_id for track_id in track_ids if track_id})
+        tracks = self._collection()
+        if not ids or tracks is None:
+            return {}
+        projection = {field: 1 for field in REQUEST_TRACK_FIELDS.values()}
+        return {doc["_id"]: doc for doc in tracks.find({"_id": {"$in": ids}}, projection)}
+
+    def compact_request(self, request_doc: Dict) -> Dict:
+        """
+        Drop a request's null fields before it is stored
+
+        Client-sent URL fields stay on the request: they are unvalidated,
+        so they are never shared through the track document. The
+        enrichment worker removes them once Spotify has confirmed the ID
+        and the track document holds its own metadata.
+        """
+        return {k: v for k, v in request_doc.items() if v is not None}
+
+    def expand_request(self, request_doc: Dict, track: Optional[Dict]) -> Dict:
+        """Fill a request's track fields from its track document"""
+        if not track:
+            return request_doc
+        for request_field, track_field in REQUEST_TRACK_FIELDS.items():
+            if request_doc.get(request_field) is None and track.get(track_field) is not None:
+                request_doc[request_field] = track[track_field]
+        return request_doc
+
+
+# Global instance
+track_store = TrackStore()
@@ -0,0 +1,180 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from fastapi.responses import JSONResponse
+from pymongo.monitoring import CommandListener
+from starlette.datastructures import MutableHeaders
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Where a command keeps the filter worth logging, by command name
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+
+def filter_shape(value: Any) -> Any:
+    """A filter with its values replaced by their type names, so it can be logged"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = filter_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+
+class RequestTiming:
+    """Time spent per phase while handling one request"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        # Commands in flight, by (connection, request id)
+        self.commands: Dict[tuple, Dict] = {}
+        self.slowest_command: Optional[Dict] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def header(self, total: float) -> str:
+        entries = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{self.counts[phase]}x"'
+            for phase, seconds in self.phases.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+    def record(self, scope: Dict, status_code: int, total: float) -> Dict:
+        """Structured log record for a slow request"""
+        record = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "total_ms": round(total * 1000, 1),
+            "phases": {
+                phase: {"ms": round(seconds * 1000, 1), "count": self.counts[phase]}
+                for phase, seconds in self.phases.items()
+            },
+        }
+        if self.slowest_command is not None:
+            command = self.slowest_command["command"]
+            name = self.slowest_command["name"]
+            field = _FILTER_FIELDS.get(name)
+            record["slowest_command"] = {
+                "name": name,
+                "collection": command.get(name) if isinstance(command.get(name), str) else None,
+                "ms": round(self.slowest_command["seconds"] * 1000, 1),
+                "filter": filter_shape(command.get(field)) if field else None,
+            }
+        return record
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to the current request's `name` phase"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+class CommandTimer(CommandListener):
+    """Adds MongoDB command durations to the current request's db phase"""
+
+    def started(self, event):
+        timing = _current.get()
+        if timing is not None:
+            timing.commands[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        timing = _current.get()
+        if timing is None:
+            return
+        command = timing.commands.pop((event.connection_id, event.request_id), None)
+        seconds = event.duration_micros / 1_000_000
+        timing.add("db", seconds)
+        slowest = timing.slowest_command
+        if command is not None and (slowest is None or seconds > slowest["seconds"]):
+            timing.slowest_command = {"name": event.command_name, "command": command, "seconds": seconds}
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records the time spent encoding as the encode phase"""
+
+    def render(self, content: Any) -> bytes:
+        with phase("encode"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """
+    Reports per-phase timings for each request
+
+    Phases (db, spotify, hash, model, encode) are accumulated while the
+    request is handled and sent as a Server-Timing header. Requests slower
+    than SLOW_REQUEST_THRESHOLD_MS are logged as a JSON record with the
+    phase breakdown and the slowest MongoDB command with its filter shape.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_HEADER:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", timing.header(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - start
+            if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+                logger.warning("Slow request %s", json.dumps(timing.record(scope, status_code, total)))
+
+
+# Global instance
+command_timer = CommandTimer()
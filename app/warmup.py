@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+from app.database import ensure_indexes, get_database
+from app.services.spotify import get_spotify_service
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between attempts to create indexes while MongoDB is unreachable
+INDEX_RETRY_MAX_SECONDS = 30
+
+_task: Optional[asyncio.Task] = None
+_index_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+# Set once every index exists; registration relies on the unique ones
+indexes_ready = threading.Event()
+
+def create_indexes():
+    """Create indexes, retrying with backoff until MongoDB accepts them or the app stops"""
+    delay = 1.0
+    while not _stop.is_set():
+        try:
+            ensure_indexes()
+        except Exception as e:
+            logger.warning("Creating MongoDB indexes failed, retrying in %.0fs: %s", delay, e)
+        else:
+            indexes_ready.set()
+            return
+        _stop.wait(delay)
+        delay = min(delay * 2, INDEX_RETRY_MAX_SECONDS)
+
+def prewarm():
+    """Open the Mongo pool and fetch a Spotify token"""
+    start = time.perf_counter()
+    try:
+        # Server discovery lets pymongo fill the pool up to MONGO_MIN_POOL_SIZE
+        get_database().command("ping")
+    except Exception as e:
+        logger.warning("MongoDB prewarm failed: %s", e)
+    try:
+        get_spotify_service().warm_up()
+    except Exception as e:
+        logger.warning("Spotify prewarm failed: %s", e)
+    logger.info("Prewarm finished in %.0fms", (time.perf_counter() - start) * 1000)
+
+def start_prewarm():
+    """
+    Create indexes and run prewarm() in background threads
+
+    Startup does not wait for MongoDB or Spotify. Index creation has its
+    own thread because it keeps retrying while MongoDB is unreachable;
+    /ready reports unavailable until it has succeeded.
+    """
+    global _task, _index_thread
+    _stop.clear()
+    if not indexes_ready.is_set():
+        _index_thread = threading.Thread(target=create_indexes, name="create-indexes", daemon=True)
+        _index_thread.start()
+    _task = asyncio.get_running_loop().create_task(asyncio.to_thread(prewarm))
+
+def stop_prewarm():
+    """Stop retrying index creation"""
+    global _index_thread
+    _stop.set()
+    if _index_thread is not None:
+        _index_thread.join(timeout=2)
+        _index_thread = None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Queue payload benchmark
+
+Measures bytes on the wire and server CPU per response for the public
+queue at typical sizes, comparing the full RequestPublic list with a
+sparse fieldset, each with and without gzip at GZIP_COMPRESSLEVEL. Runs
+on synthetic requests in process, so it needs no database.
+
+    python benchmark_queue_payload.py
+    python benchmark_queue_payload.py --fields song_title,requester_name --sizes 25,100
+"""
+import argparse
+import gzip
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.routers.requests import _parse_fields, _to_request_public, _to_sparse_request
+
+# What a phone showing the queue as a list of cards needs
+DEFAULT_FIELDS = "song_title,song_artist,requester_name,tip_amount,queue_position"
+
+SONGS = [
+    ("Wonderwall", "Oasis"), ("Mr. Brightside", "The Killers"), ("Dancing Queen", "ABBA"),
+    ("Sweet Caroline", "Neil Diamond"), ("Don't Stop Believin'", "Journey"), ("Valerie", "Amy Winehouse"),
+    ("Take On Me", "a-ha"), ("Bohemian Rhapsody", "Queen"), ("Africa", "Toto"), ("Hey Jude", "The Beatles"),
+]
+NAMES = ["Sam", "Alex", "Jordan", "Taylor", "Riley", "Casey", "Morgan", "Jamie"]
+
+
+def make_queue(size: int) -> list:
+    """Expanded pending request documents, most with Spotify metadata, some with a message or tip"""
+    rng = random.Random(size)
+    start = datetime(2024, 5, 1, 20, 0)
+    queue = []
+    for position in range(1, size + 1):
+        title, artist = rng.choice(SONGS)
+        track_id = "".join(rng.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz") for _ in range(22))
+        doc = {
+            "_id": ObjectId(),
+            "artist_username": "band",
+            "song_title": title,
+            "song_artist": artist,
+            "requester_name": rng.choice(NAMES),
+            "message": "Happy birthday to my sister, she loves this one!" if rng.random() < 0.3 else None,
+            "tip_amount": rng.choice([None, None, 2.0, 5.0, 10.0]),
+            "status": "pending",
+            "queue_position": position,
+            "created_at": start + timedelta(seconds=37 * position),
+        }
+        if rng.random() < 0.8:
+            doc.update({
+                "spotify_track_id": track_id,
+                "spotify_track_url": f"https://open.spotify.com/track/{track_id}",
+                "album_image_url": f"https://i.scdn.co/image/ab67616d0000b273{track_id.lower()}{track_id[:18].lower()}",
+                "preview_url": f"https://p.scdn.co/mp3-preview/{track_id.lower()}{track_id.lower()}?cid=0123456789abcdef",
+            })
+        queue.append(doc)
+    return queue
+
+
+def render_full(queue: list) -> bytes:
+    """Serialize as the route does without fields: models, dumped in JSON mode for response_model"""
+    return JSONResponse([_to_request_public(doc).model_dump(mode="json") for doc in queue]).body
+
+
+def render_sparse(queue: list, fields: list) -> bytes:
+    return JSONResponse([_to_sparse_request(doc, fields) for doc in queue]).body
+
+
+def cpu_per_call(fn, repeat: int) -> float:
+    """Mean CPU time of `fn` in milliseconds"""
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,50,200,500", help="Comma-separated queue sizes")
+    parser.add_argument("--fields", default=DEFAULT_FIELDS, help="Sparse fieldset to compare against")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per CPU measurement")
+    args = parser.parse_args()
+
+    fields = _parse_fields(args.fields)
+    level = settings.GZIP_COMPRESSLEVEL
+    print(f"Sparse fields: {','.join(fields)}")
+    print(f"gzip level {level}, applied above {settings.GZIP_MINIMUM_SIZE} bytes\n")
+    print(f"{'size':>5}  {'shape':<12}{'bytes':>9}{'gzip':>9}{'ratio':>8}{'encode ms':>11}{'gzip ms':>9}")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        queue = make_queue(size)
+        repeat = max(10, args.repeat * 50 // max(size, 50))
+        baseline = None
+        for shape, render in (("full", lambda: render_full(queue)), ("sparse", lambda: render_sparse(queue, fields))):
+            body = render()
+            compressed = gzip.compress(body, compresslevel=level)
+            wire = compressed if len(body) >= settings.GZIP_MINIMUM_SIZE else body
+            baseline = baseline or len(body)
+            encode_ms = cpu_per_call(render, repeat)
+            gzip_ms = cpu_per_call(lambda: gzip.compress(body, compresslevel=level), repeat)
+            print(f"{size:>5}  {shape:<12}{len(body):>9}{len(wire):>9}{baseline / len(wire):>7.1f}x{encode_ms:>11.2f}{gzip_ms:>9.2f}")
+        print()
+
+    print("ratio: full uncompressed bytes over bytes sent for that shape")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Batch loader tests
+
+Checks that lookups issued in the same event-loop tick are deduplicated
+and resolved with one batch call, that later ticks get their own batch,
+and that a failing batch reaches every waiter. No database is needed.
+
+    python test_batch_loader.py
+"""
+import asyncio
+import sys
+
+from app.services.loader import BatchLoader
+
+
+def counting_loader():
+    calls = []
+
+    def batch_fn(keys):
+        calls.append(sorted(keys))
+        return {key: {"username": key} for key in keys if key != "missing"}
+    return BatchLoader(batch_fn), calls
+
+
+async def test_same_tick_lookups_share_one_batch():
+    loader, calls = counting_loader()
+    results = await asyncio.gather(*[loader.load(key) for key in ["band", "band", "duo", "missing", "band"]])
+    assert calls == [["band", "duo", "missing"]], calls
+    assert [r and r["username"] for r in results] == ["band", "band", "duo", None, "band"]
+
+
+async def test_concurrent_handlers_share_one_batch():
+    loader, calls = counting_loader()
+
+    async def handler(key):
+        # Work before the lookup in the same tick, as a request handler would do
+        await asyncio.sleep(0)
+        return await loader.load(key)
+
+    await asyncio.gather(*[handler("band") for _ in range(50)])
+    assert calls == [["band"]], calls
+
+
+async def test_later_ticks_get_their_own_batch():
+    loader, calls = counting_loader()
+    await loader.load("band")
+    await loader.load("band")
+    assert calls == [["band"], ["band"]], "nothing is cached between batches"
+
+
+async def test_failing_batch_reaches_every_waiter():
+    def batch_fn(keys):
+        raise RuntimeError("database down")
+    loader = BatchLoader(batch_fn)
+    results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results), results
+    # The loader recovers for the next tick
+    loader.batch_fn = lambda keys: {key: key for key in keys}
+    assert await loader.load("a") == "a"
+
+
+def main():
+    tests = [
+        test_same_tick_lookups_share_one_batch,
+        test_concurrent_handlers_share_one_batch,
+        test_later_ticks_get_their_own_batch,
+        test_failing_batch_reaches_every_waiter,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            asyncio.run(test())
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
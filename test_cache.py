@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Two-tier cache tests
+
+Checks the in-process tier on its own, then runs two cache instances
+against one shared Redis to check that values and invalidations cross
+instances and that a failing Redis falls back to the local tier. Uses
+fakeredis as the shared tier if it is installed, otherwise the Redis at
+REDIS_URL; the shared-tier tests are skipped if neither is available.
+
+    docker run -d -p 6379:6379 redis:7
+    python test_cache.py
+"""
+import importlib.metadata
+import os
+import sys
+import time
+
+from app.services.cache import TieredCache
+
+
+def shared_clients():
+    """Two clients for the same Redis, one per simulated instance"""
+    try:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        return fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server, decode_responses=True)
+    except ImportError:
+        import redis
+        url = os.getenv("REDIS_URL", "redis://localhost:6379/15")
+        first = redis.Redis.from_url(url, decode_responses=True)
+        first.ping()
+        first.flushdb()
+        return first, redis.Redis.from_url(url, decode_responses=True)
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_local_tier_ttls():
+    artists = TieredCache().namespace("artists", ttl=60, max_entries=2)
+    artists.set("a", {"username": "a"})
+    assert artists.get("a") == ({"username": "a"}, False)
+
+    # Bounded: the least recently used entry is evicted
+    artists.set("b", {"username": "b"})
+    artists.set("c", {"username": "c"})
+    assert artists.get("a") == (None, False)
+
+    searches = TieredCache().namespace("searches", ttl=60, stale_ttl=3600)
+    searches.set("q", [1, 2])
+    searches.ttl = 0
+    assert searches.get("q") == ([1, 2], True), "expired entries inside the stale window are served as stale"
+
+
+def test_shared_tier_fills_other_instances(first, second):
+    a = TieredCache(client=first).namespace("tracks", ttl=60)
+    b = TieredCache(client=second).namespace("tracks", ttl=60)
+    a.set("t1", {"name": "Wonderwall"})
+    assert b.get("t1") == ({"name": "Wonderwall"}, False)
+    assert b.shared_hits == 1
+    # Now served from b's local tier
+    assert b.get("t1") == ({"name": "Wonderwall"}, False)
+    assert b.hits == 1
+    found = b.get_many(["t1", "t2"])
+    assert list(found) == ["t1"]
+
+
+def test_invalidation_reaches_other_instances(first, second):
+    cache_a, cache_b = TieredCache(client=first), TieredCache(client=second)
+    a = cache_a.namespace("artists", ttl=60)
+    b = cache_b.namespace("artists", ttl=60)
+    cache_b.start()
+    try:
+        time.sleep(0.2)  # let the listener subscribe
+        a.set("band", {"queue_order": "position"})
+        assert b.get("band")[0] == {"queue_order": "position"}
+        a.invalidate("band")
+        assert wait_for(lambda: b.local.get("band")[0] is None), "b kept its local copy"
+        assert b.get("band") == (None, False)
+    finally:
+        cache_b.stop()
+
+
+def test_failing_shared_tier_falls_back_to_local():
+    class BrokenRedis:
+        def __getattr__(self, name):
+            import redis
+
+            def fail(*args, **kwargs):
+                raise redis.ConnectionError("down")
+            return fail
+
+    broken = TieredCache(client=BrokenRedis())
+    artists = broken.namespace("artists", ttl=60)
+    artists.set("band", {"username": "band"})
+    assert artists.get("band") == ({"username": "band"}, False)
+    assert artists.get("other") == (None, False)
+    for _ in range(broken.breaker.failure_threshold):
+        artists.get("other")
+    assert broken.breaker.state == "open"
+
+
+def main():
+    tests = [(test_local_tier_ttls, ()), (test_failing_shared_tier_falls_back_to_local, ())]
+    try:
+        clients = shared_clients()
+        # Results hold for this client version; requirements.txt pins the one they were run with
+        print(f"redis-py {importlib.metadata.version('redis')}")
+        tests += [
+            (test_shared_tier_fills_other_instances, clients),
+            (test_invalidation_reaches_other_instances, clients),
+        ]
+    except Exception as e:
+        print(f"⚠️  No Redis reachable, skipping shared-tier tests: {e}")
+
+    failed = 0
+    for test, args in tests:
+        try:
+            test(*args)
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Song catalog tests
+
+Builds an ArtistCatalog in memory and checks type-ahead prefix search,
+ranking, the trigram fallback for typos, and that a song requested with
+and without a Spotify ID is a single entry. Needs no database.
+
+    python test_catalog.py
+"""
+import sys
+
+from app.services.catalog import ArtistCatalog, catalog_key, normalize
+
+
+def make_catalog():
+    catalog = ArtistCatalog("band")
+    catalog.add("Wonderwall", "Oasis", request_count=3)
+    catalog.add("Don't Look Back in Anger", "Oasis", request_count=5)
+    catalog.add("Champagne Supernova", "Oasis", curated=True)
+    catalog.add("Mr. Brightside", "The Killers", request_count=1)
+    catalog.add("Beyoncé Medley", "Café Tacvba")
+    return catalog
+
+
+def names(results):
+    return [entry["name"] for entry in results]
+
+
+def test_normalize():
+    assert normalize("  Don't   Look BACK!") == "don t look back"
+    assert normalize("Beyoncé") == "beyonce"
+    assert catalog_key("Mr. Brightside", "The Killers") == catalog_key("mr brightside", "the  killers")
+
+
+def test_prefix_search():
+    catalog = make_catalog()
+    assert names(catalog.search("wond")) == ["Wonderwall"]
+    # Every token must prefix a word of the title or artist
+    assert names(catalog.search("oasis wo")) == ["Wonderwall"]
+    assert names(catalog.search("killers bright")) == ["Mr. Brightside"]
+    # Accents are ignored on both sides
+    assert names(catalog.search("beyonce")) == ["Beyoncé Medley"]
+    assert names(catalog.search("cafe")) == ["Beyoncé Medley"]
+
+
+def test_ranking():
+    catalog = make_catalog()
+    # Curated songs first, then the most requested
+    assert names(catalog.search("oasis")) == ["Champagne Supernova", "Don't Look Back in Anger", "Wonderwall"]
+    assert len(catalog.search("oasis", limit=2)) == 2
+
+
+def test_fuzzy_fallback():
+    catalog = make_catalog()
+    assert names(catalog.search("wonderwal oasis"))[:1] == ["Wonderwall"]
+    assert names(catalog.search("brightsde"))[:1] == ["Mr. Brightside"]
+    assert catalog.search("zzzz qqqq") == []
+
+
+def test_same_song_with_and_without_id_is_one_entry():
+    catalog = ArtistCatalog("band")
+    catalog.add("Wonderwall", "Oasis", request_count=2)
+    catalog.add("wonderwall", "OASIS", spotify_track_id="5qqabIl2vWzo9ApSC317sa",
+                album_image_url="https://i.scdn.co/image/wonderwall", request_count=1)
+    catalog.add("Wonderwall!", "Oasis", request_count=1)
+    results = catalog.search("wonderwall")
+    assert len(results) == 1, results
+    entry = results[0]
+    assert entry["request_count"] == 4, entry
+    assert entry["id"] == "5qqabIl2vWzo9ApSC317sa", "the Spotify ID is kept once it appears"
+    assert entry["album_image"] == "https://i.scdn.co/image/wonderwall"
+
+
+def main():
+    tests = [
+        test_normalize,
+        test_prefix_search,
+        test_ranking,
+        test_fuzzy_fallback,
+        test_same_song_with_and_without_id_is_one_entry,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
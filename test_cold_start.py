@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget check
+
+Measures, in fresh interpreters, how long `import app.main` takes and how
+long a new uvicorn process takes to answer its first /health request.
+Fails when either exceeds its budget, or when modules that should load
+lazily are imported at startup. Budgets can be tuned with
+COLD_START_IMPORT_BUDGET_MS and COLD_START_FIRST_REQUEST_BUDGET_MS.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+IMPORT_BUDGET_MS = float(os.getenv("COLD_START_IMPORT_BUDGET_MS", "1500"))
+FIRST_REQUEST_BUDGET_MS = float(os.getenv("COLD_START_FIRST_REQUEST_BUDGET_MS", "3000"))
+
+# Loaded on first use rather than at import time
+LAZY_MODULES = ["spotipy", "requests", "redis", "jose", "passlib", "argon2"]
+
+# Startup must not wait on MongoDB, so point it at an address nothing listens on
+ENV = {**os.environ, "MONGODB_URL": "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=500"}
+
+
+def test_import_time():
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        env=ENV, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print(f"  import app.main: {result['ms']:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)")
+    assert not result["loaded"], f"loaded eagerly: {result['loaded']}"
+    assert result["ms"] <= IMPORT_BUDGET_MS, f"import took {result['ms']:.0f}ms"
+
+
+def test_first_request_time():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        env=ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + FIRST_REQUEST_BUDGET_MS / 1000 + 5
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.02)
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        server.kill()
+        server.wait()
+
+    print(f"  first /health response: {elapsed:.0f}ms (budget {FIRST_REQUEST_BUDGET_MS:.0f}ms)")
+    assert elapsed <= FIRST_REQUEST_BUDGET_MS, f"first request took {elapsed:.0f}ms"
+
+
+if __name__ == "__main__":
+    failed = 0
+    for test in [test_import_time, test_first_request_time]:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    sys.exit(1 if failed else 0)
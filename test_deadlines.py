@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Request deadline tests
+
+Runs a small app behind DeadlineMiddleware and checks that handlers which
+overrun their budget are cancelled with a 504 and counted, that outbound
+HTTP timeouts (as used for Spotify) are cut to the time left, and, when a
+local mongod is reachable (MONGODB_URL), that a slow query is stopped by
+maxTimeMS and answered with a 504. MongoDB failures while budget is left
+are answered with a 503 and not counted as deadline timeouts.
+
+    python test_deadlines.py
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=2000")
+
+import requests
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo import MongoClient
+from pymongo.errors import ExecutionTimeout, PyMongoError, ServerSelectionTimeoutError
+
+from app import deadlines
+from app.config import settings
+from app.deadlines import DeadlineMiddleware, deadline_metrics, mongo_timeout_handler
+from app.services.spotify import _deadline_session
+
+settings.DEADLINE_DEFAULT_MS = 300
+
+
+class SlowUpstream(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(2)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+app = FastAPI()
+app.add_middleware(DeadlineMiddleware)
+app.add_exception_handler(PyMongoError, mongo_timeout_handler)
+
+
+@app.get("/slow-handler")
+async def slow_handler():
+    await asyncio.sleep(2)
+    return {"ok": True}
+
+
+@app.get("/fast-handler")
+async def fast_handler():
+    left = deadlines.remaining()
+    return {"remaining": left}
+
+
+@app.get("/slow-upstream")
+async def slow_upstream():
+    upstream = app.state.upstream
+    try:
+        _deadline_session().get(upstream, timeout=(2, 5))
+    except requests.exceptions.Timeout:
+        deadlines.check("spotify")
+    return {"ok": True}
+
+
+@app.get("/mongo-down")
+async def mongo_down():
+    raise ServerSelectionTimeoutError("No servers found yet")
+
+
+@app.get("/early-mongo-timeout")
+async def early_mongo_timeout():
+    raise ExecutionTimeout("operation exceeded time limit", code=50)
+
+
+@app.get("/late-mongo-timeout")
+async def late_mongo_timeout():
+    # As maxTimeMS does: the server gives up a round trip before the deadline
+    await asyncio.sleep(max(deadlines.remaining() - 0.02, 0))
+    raise ExecutionTimeout("operation exceeded time limit", code=50)
+
+
+@app.get("/slow-query")
+async def slow_query():
+    app.state.mongo.requestr_deadlines.slow.find_one({"$where": "sleep(1000) || true"})
+    return {"ok": True}
+
+
+client = TestClient(app)
+
+
+def test_handler_overrun_is_cancelled():
+    before = deadline_metrics.timeouts["handler"]
+    start = time.monotonic()
+    response = client.get("/slow-handler")
+    assert response.status_code == 504, response.status_code
+    assert time.monotonic() - start < 1, "handler was not cut off at its budget"
+    assert deadline_metrics.timeouts["handler"] == before + 1
+
+
+def test_remaining_budget_is_visible():
+    remaining = client.get("/fast-handler").json()["remaining"]
+    assert 0 < remaining <= 0.3, remaining
+
+
+def test_upstream_timeouts_are_clamped():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.state.upstream = f"http://127.0.0.1:{server.server_port}/"
+    before = deadline_metrics.timeouts["spotify"]
+    start = time.monotonic()
+    response = client.get("/slow-upstream")
+    assert response.status_code == 504, response.status_code
+    assert time.monotonic() - start < 1, "read timeout was not shortened to the budget"
+    assert deadline_metrics.timeouts["spotify"] == before + 1
+    server.shutdown()
+
+
+def test_clamp_outside_a_request_is_unchanged():
+    assert deadlines.clamp_timeout((2, 5), "spotify") == (2, 5)
+
+
+def test_mongo_outage_is_not_a_deadline_overrun():
+    before = deadline_metrics.timeouts["mongo"]
+    assert client.get("/mongo-down").status_code == 503
+    # Budget left: the timeout was not caused by this request's deadline
+    assert client.get("/early-mongo-timeout").status_code == 503
+    assert deadline_metrics.timeouts["mongo"] == before, "outage counted as a deadline timeout"
+
+
+def test_mongo_timeout_at_the_deadline_is_a_504():
+    before = deadline_metrics.timeouts["mongo"]
+    assert client.get("/late-mongo-timeout").status_code == 504
+    assert deadline_metrics.timeouts["mongo"] == before + 1
+
+
+def test_slow_query_gets_max_time_ms(mongo):
+    app.state.mongo = mongo
+    mongo.requestr_deadlines.slow.insert_one({"x": 1})
+    try:
+        before = deadline_metrics.timeouts["mongo"]
+        response = client.get("/slow-query")
+        assert response.status_code == 504, response.status_code
+        assert deadline_metrics.timeouts["mongo"] == before + 1
+    finally:
+        mongo.drop_database("requestr_deadlines")
+
+
+def main():
+    tests = [
+        (test_handler_overrun_is_cancelled, ()),
+        (test_remaining_budget_is_visible, ()),
+        (test_upstream_timeouts_are_clamped, ()),
+        (test_clamp_outside_a_request_is_unchanged, ()),
+        (test_mongo_outage_is_not_a_deadline_overrun, ()),
+        (test_mongo_timeout_at_the_deadline_is_a_504, ()),
+    ]
+    mongo = MongoClient(os.environ["MONGODB_URL"])
+    try:
+        mongo.admin.command("ping")
+        tests.append((test_slow_query_gets_max_time_ms, (mongo,)))
+    except PyMongoError as e:
+        print(f"⚠️  No MongoDB reachable, skipping maxTimeMS test: {e}")
+
+    failed = 0
+    for test, args in tests:
+        try:
+            test(*args)
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
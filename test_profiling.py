@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Request profiling tests
+
+Runs a small app behind ProfilingMiddleware and checks that only requests
+with the profiling token are profiled, that the saved profile is in the
+folded-stack format and contains the route's own frames, and that the
+stored files are capped. No database is needed.
+
+    python test_profiling.py
+"""
+import sys
+import tempfile
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.profiling import ProfilingMiddleware, profile_store
+
+settings.PROFILE_TOKEN = "test-token"
+settings.PROFILE_SAMPLE_RATE = 0
+settings.PROFILE_INTERVAL_MS = 1
+settings.PROFILE_DIR = tempfile.mkdtemp(prefix="requestr-profiles-")
+settings.PROFILE_MAX_FILES = 3
+
+app = FastAPI()
+app.add_middleware(ProfilingMiddleware)
+
+
+def spin_for_a_while():
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+
+
+@app.get("/busy")
+async def busy():
+    spin_for_a_while()
+    return {"ok": True}
+
+
+client = TestClient(app)
+
+
+def test_requests_without_token_are_not_profiled():
+    response = client.get("/busy")
+    assert "x-profile-id" not in response.headers
+    response = client.get("/busy", headers={"X-Profile-Token": "wrong"})
+    assert "x-profile-id" not in response.headers
+    assert profile_store.list() == []
+
+
+def test_token_profiles_the_route():
+    response = client.get("/busy", headers={"X-Profile-Token": "test-token"})
+    name = response.headers["x-profile-id"]
+    with open(profile_store.path(name)) as f:
+        lines = f.read().splitlines()
+    assert lines, "profile is empty"
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack
+    assert any("spin_for_a_while (test_profiling.py" in line for line in lines), lines[:3]
+
+
+def test_stored_profiles_are_capped():
+    for _ in range(5):
+        client.get("/busy", headers={"X-Profile-Token": "test-token"})
+    assert len(profile_store.list()) == settings.PROFILE_MAX_FILES
+
+
+def test_profile_names_are_validated():
+    assert profile_store.path("../../etc/passwd") is None
+    assert profile_store.path("nope.folded") is None
+
+
+def main():
+    tests = [
+        test_requests_without_token_are_not_profiled,
+        test_token_profiles_the_route,
+        test_stored_profiles_are_capped,
+        test_profile_names_are_validated,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression tests
+
+Seeds a throwaway database on a local mongod (MONGODB_URL, default
+mongodb://localhost:27017), creates the app's indexes, and runs explain()
+on every query shape the routers and services send. Filters, sorts,
+projections and pipelines come from the same helpers the routers use, so
+the shapes cannot drift from the real queries. A shape fails if its
+winning plan contains a COLLSCAN or an in-memory SORT, or if it examines
+more than MAX_DOCS_EXAMINED_RATIO documents per document it returns,
+unless the shape is explicitly allowed to. Each line reports the
+indexes the winning plan used and what it examined, so a run's output
+can be kept as the record of the plans.
+
+    docker run -d -p 27017:27017 mongo:7
+    python test_query_plans.py
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+# Never touch a real database: everything goes into a dedicated one on a local mongod
+os.environ["DATABASE_NAME"] = "requestr_query_plans"
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=2000")
+
+from pymongo.errors import PyMongoError
+
+from app.database import connect_to_mongo, close_mongo_connection, ensure_indexes, get_database
+from app.models.artist import QueueOrder
+from app.models.request import RequestStatus
+from app.routers.requests import (
+    EXPORT_FIELDS, EXPORT_SORT, HISTORY_SORT,
+    _artist_requests_query, _history_query, _parse_fields, _sparse_projection
+)
+from app.services.catalog import request_counts_pipeline
+from app.services.queue_snapshot import QUEUE_SORTS
+
+MAX_DOCS_EXAMINED_RATIO = float(os.getenv("MAX_DOCS_EXAMINED_RATIO", "3"))
+
+# What a shape may do that would otherwise fail it
+SORT = "in-memory sort"
+EXAMINED = "docs examined ratio"
+
+ARTIST = "plan_artist"
+OTHER_ARTISTS = ["plan_other_1", "plan_other_2"]
+REQUESTS_PER_ARTIST = 600
+PENDING_PER_ARTIST = 40
+
+
+def seed(db):
+    """Several artists with a realistic mix of statuses, tips and dates"""
+    now = datetime.utcnow()
+    random.seed(7)
+    for username in [ARTIST] + OTHER_ARTISTS:
+        db.artists.insert_one({
+            "username": username,
+            "email": f"{username}@example.com",
+            "display_name": username,
+            "hashed_password": "x",
+            "is_active": True,
+            "queue_order": "position",
+        })
+        requests = []
+        for i in range(REQUESTS_PER_ARTIST):
+            pending = i >= REQUESTS_PER_ARTIST - PENDING_PER_ARTIST
+            requests.append({
+                "artist_username": username,
+                "song_title": f"Song {i}",
+                "song_artist": random.choice(["Oasis", "Blur", "Pulp", "Radiohead"]),
+                "requester_name": random.choice(["Sam", "Alex", "Jo", "Chris"]),
+                "tip_amount": random.choice([None, 0, 2, 5, 10, 20]),
+                "status": "pending" if pending else random.choice(["completed"] * 4 + ["rejected"]),
+                "queue_position": i - (REQUESTS_PER_ARTIST - PENDING_PER_ARTIST) + 1 if pending else 1,
+                "created_at": now - timedelta(minutes=REQUESTS_PER_ARTIST - i) - timedelta(days=90 * (1 - i / REQUESTS_PER_ARTIST)),
+                "spotify_track_id": f"track{i % 50}",
+            })
+        db.requests.insert_many(requests)
+        db.repertoire.insert_many([
+            {"artist_username": username, "song_title": f"Song {i}", "song_artist": "Oasis"}
+            for i in range(20)
+        ])
+    db.tracks.insert_many([
+        {"_id": f"track{i}", "name": f"Song {i}", "fetched_at": now} for i in range(50)
+    ])
+
+
+def find(collection, filter, sort=None, limit=None, projection=None):
+    command = {"find": collection, "filter": filter}
+    if sort:
+        command["sort"] = dict(sort)
+    if limit:
+        command["limit"] = limit
+    if projection:
+        command["projection"] = projection
+    return command
+
+
+def aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+
+def update(collection, q, u, multi=False):
+    return {"update": collection, "updates": [{"q": q, "u": u, "multi": multi}]}
+
+
+def delete(collection, q, limit=1):
+    return {"delete": collection, "deletes": [{"q": q, "limit": limit}]}
+
+
+def query_shapes(db):
+    """(name, explain command, allowances) for every query the app sends"""
+    now = datetime.utcnow()
+    request = db.requests.find_one({"artist_username": ARTIST, "status": "pending"})
+    request_id = request["_id"]
+    artist = {"artist_username": ARTIST}
+    pending = _artist_requests_query(ARTIST, "pending")
+    by_position = QUEUE_SORTS[QueueOrder.POSITION]
+    by_tip = QUEUE_SORTS[QueueOrder.TIPS]
+    sparse = _parse_fields("song_title,requester_name,album_image_url")
+    return [
+        # auth / artists
+        ("artist by username", find("artists", {"username": ARTIST}, limit=1), ()),
+        ("artists by usernames", find("artists", {"username": {"$in": [ARTIST] + OTHER_ARTISTS}}), ()),
+        ("artist by email", find("artists", {"email": f"{ARTIST}@example.com"}, limit=1), ()),
+        ("active artist", find("artists", {"username": ARTIST, "is_active": True}, limit=1), ()),
+        ("artist queue order", find("artists", {"username": ARTIST}, limit=1, projection={"queue_order": 1}), ()),
+        ("set queue order", update("artists", {"username": ARTIST}, {"$set": {"queue_order": "tips"}}), ()),
+        # requests: queue reads
+        ("last queue position", find("requests", pending, sort=[("queue_position", -1)], limit=1), ()),
+        ("pending queue by position", find("requests", pending, sort=by_position), ()),
+        ("pending queue by tip", find("requests", pending, sort=by_tip), ()),
+        ("completed requests", find("requests", _artist_requests_query(ARTIST, "completed"), sort=by_position), ()),
+        ("completed requests, sparse", find(
+            "requests", _artist_requests_query(ARTIST, "completed"), sort=by_position,
+            projection=_sparse_projection(sparse, "queue_position")
+        ), ()),
+        ("all requests", find("requests", _artist_requests_query(ARTIST, "all"), sort=by_position), ()),
+        # requests: history search
+        ("history page", find("requests", _history_query(ARTIST), sort=HISTORY_SORT, limit=21), ()),
+        ("history page, sparse", find(
+            "requests", _history_query(ARTIST), sort=HISTORY_SORT, limit=21,
+            projection=_sparse_projection(sparse, "created_at")
+        ), ()),
+        ("history date range", find(
+            "requests",
+            _history_query(ARTIST, created_from=now - timedelta(days=30), created_to=now - timedelta(days=7)),
+            sort=HISTORY_SORT, limit=21
+        ), ()),
+        ("history completed", find(
+            "requests", _history_query(ARTIST, status_filter=RequestStatus.COMPLETED), sort=HISTORY_SORT, limit=21
+        ), ()),
+        ("history next page", find(
+            "requests", _history_query(ARTIST, cursor=f"{request['created_at'].isoformat()}_{request_id}"),
+            sort=HISTORY_SORT, limit=21
+        ), ()),
+        ("history export", find(
+            "requests", _history_query(ARTIST, created_from=now - timedelta(days=365)),
+            sort=EXPORT_SORT, projection=_sparse_projection(EXPORT_FIELDS)
+        ), ()),
+        # Text matches carry no index order, so they are sorted in memory (top-k, bounded
+        # by limit), and every match for the artist is read to find the newest page
+        ("history text search", find(
+            "requests", _history_query(ARTIST, q="oasis"), sort=HISTORY_SORT, limit=21
+        ), (SORT, EXAMINED)),
+        # requests: single-request mutations look up by _id; ownership is checked in Python
+        ("request by id", find("requests", {"_id": request_id}, limit=1), ()),
+        ("update request", update("requests", {"_id": request_id}, {"$set": {"status": "completed"}}), ()),
+        ("delete request", delete("requests", {"_id": request_id}), ()),
+        ("shift queue after delete", update(
+            "requests",
+            {"artist_username": ARTIST, "queue_position": {"$gt": 10}, "status": "pending"},
+            {"$inc": {"queue_position": -1}}, multi=True
+        ), ()),
+        # requests: bulk queue operations
+        ("complete next", {
+            "findAndModify": "requests", "query": pending, "sort": dict(by_position),
+            "update": {"$set": {"status": "completed"}}
+        }, ()),
+        ("complete next by tip", {
+            "findAndModify": "requests", "query": pending, "sort": dict(by_tip),
+            "update": {"$set": {"status": "completed"}}
+        }, ()),
+        ("clear queue", update("requests", pending, {"$set": {"status": "rejected"}}, multi=True), ()),
+        ("set status by ids", update(
+            "requests", {"_id": {"$in": [request_id]}, **pending}, {"$set": {"status": "rejected"}}, multi=True
+        ), ()),
+        ("compact queue", find("requests", pending, sort=by_position, projection={"queue_position": 1}), ()),
+        # catalog
+        ("repertoire", find("repertoire", artist), ()),
+        ("replace repertoire", delete("repertoire", artist, limit=0), ()),
+        # Counting requests per song reads every request of the artist to return one row per song;
+        # on mongo 7 the $group runs in the query engine, so nReturned counts groups, not documents
+        ("catalog request counts", aggregate("requests", request_counts_pipeline(ARTIST)), (EXAMINED,)),
+        # tracks
+        ("cached track", find("tracks", {"_id": "track1", "fetched_at": {"$exists": True}}, limit=1), ()),
+        ("tracks for a queue", find("tracks", {"_id": {"$in": [f"track{i}" for i in range(10)]}}), ()),
+    ]
+
+
+def _plan_and_stats(explain):
+    """The winning plan and execution stats, for find, write and aggregate explains"""
+    if "stages" in explain:
+        # Aggregation: the query part runs in the leading $cursor stage
+        cursor = explain["stages"][0]["$cursor"]
+        return cursor["queryPlanner"]["winningPlan"], cursor["executionStats"]
+    return explain["queryPlanner"]["winningPlan"], explain["executionStats"]
+
+
+def _nodes(node):
+    """All stages in a plan tree (classic or slot-based engine)"""
+    if isinstance(node, list):
+        for item in node:
+            yield from _nodes(item)
+        return
+    if not isinstance(node, dict):
+        return
+    if "stage" in node:
+        yield node
+    for key in ("queryPlan", "inputStage", "inputStages", "shards"):
+        if key in node:
+            yield from _nodes(node[key])
+
+
+def _returned(stats):
+    """Documents the query produced; write explains report matches instead"""
+    stage = stats.get("executionStages", {})
+    return max(stats.get("nReturned", 0), stage.get("nMatched", 0), stage.get("nWouldDelete", 0))
+
+
+def check_shape(db, name, command, allowances):
+    """Problems with a shape's plan, and a one-line summary of it to record with the results"""
+    explain = db.command("explain", command, verbosity="executionStats")
+    plan, stats = _plan_and_stats(explain)
+    nodes = list(_nodes(plan))
+    stages = {node["stage"] for node in nodes}
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("COLLSCAN")
+    if "SORT" in stages and SORT not in allowances:
+        problems.append("in-memory SORT")
+    examined = stats["totalDocsExamined"]
+    ratio = examined / max(_returned(stats), 1)
+    if ratio > MAX_DOCS_EXAMINED_RATIO and EXAMINED not in allowances:
+        problems.append(f"examined {examined} docs for {_returned(stats)} returned ({ratio:.1f}x)")
+    indexes = sorted({node["indexName"] for node in nodes if "indexName" in node}) or sorted(stages & {"IDHACK", "EXPRESS_IXSCAN"})
+    summary = (
+        f"{', '.join(indexes) or 'no index'}; {stats['totalKeysExamined']} keys, "
+        f"{examined} docs examined, {_returned(stats)} returned"
+        f"{'; in-memory SORT' if 'SORT' in stages else ''}"
+    )
+    return problems, summary
+
+
+def main():
+    connect_to_mongo()
+    db = get_database()
+    try:
+        db.command("ping")
+    except PyMongoError as e:
+        print(f"⚠️  No MongoDB reachable, skipping query-plan tests: {e}")
+        return 0
+
+    db.client.drop_database(db.name)
+    try:
+        ensure_indexes()
+        seed(db)
+        failed = 0
+        for name, command, allowances in query_shapes(db):
+            problems, summary = check_shape(db, name, command, allowances)
+            if problems:
+                failed += 1
+                print(f"❌ {name}: {', '.join(problems)} ({summary})")
+            else:
+                print(f"✅ {name} ({summary})")
+    finally:
+        db.client.drop_database(db.name)
+        close_mongo_connection()
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} query shape(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
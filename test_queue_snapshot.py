@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Queue snapshot and delta tests
+
+Drives QueueSnapshots in memory the way the routes and the change stream
+do, and checks queue order under writes, the change log that `since`
+deltas are served from, when a client has to fall back to the full
+queue, that workers holding the same queue agree on its version, tip
+ordering, and replay of changes that race with a load. Needs no database.
+
+    python test_queue_snapshot.py
+"""
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.config import settings
+from app.models.artist import QueueOrder
+from app.services.queue_snapshot import QueueSnapshots
+
+ARTIST = "band"
+START = datetime(2024, 5, 1, 20, 0)
+
+
+def request(title, position, tip=None, minutes=0, status="pending"):
+    return {
+        "_id": ObjectId(),
+        "artist_username": ARTIST,
+        "song_title": title,
+        "status": status,
+        "queue_position": position,
+        "tip_amount": tip,
+        "created_at": START + timedelta(minutes=minutes),
+    }
+
+
+def loaded(*requests, order=QueueOrder.POSITION):
+    snapshots = QueueSnapshots()
+    # As if the change stream were up, so snapshots never expire here
+    snapshots.stream_healthy = True
+    snapshots.begin_load(ARTIST)
+    # Each snapshot gets its own copies, as each worker reads its own documents
+    snapshots.load(ARTIST, [dict(r) for r in requests], order)
+    return snapshots
+
+
+def titles(snapshots):
+    return [r["song_title"] for r in snapshots.get(ARTIST)]
+
+
+def test_queue_order_and_writes():
+    a, b, c = request("A", 1), request("B", 2), request("C", 3)
+    snapshots = loaded(c, a, b)
+    assert titles(snapshots) == ["A", "B", "C"]
+    assert snapshots.get("someone_else") is None
+
+    snapshots.set_positions(ARTIST, {str(c["_id"]): 1, str(a["_id"]): 2, str(b["_id"]): 3})
+    assert titles(snapshots) == ["C", "A", "B"]
+
+    snapshots.upsert({**a, "status": "completed"})
+    snapshots.shift_after(ARTIST, 2)
+    assert titles(snapshots) == ["C", "B"]
+    assert [r["queue_position"] for r in snapshots.get(ARTIST)] == [1, 2]
+
+
+def test_deltas_since_a_version():
+    a, b = request("A", 1), request("B", 2)
+    snapshots = loaded(a, b)
+    version, _ = snapshots.get_versioned(ARTIST)
+    assert snapshots.changes_since(ARTIST, version) == (version, [])
+
+    c = request("C", 3)
+    snapshots.upsert(c)
+    snapshots.set_positions(ARTIST, {str(c["_id"]): 1, str(a["_id"]): 2, str(b["_id"]): 3})
+    snapshots.upsert({**b, "status": "rejected"})
+    snapshots.remove(str(a["_id"]))
+
+    latest, ops = snapshots.changes_since(ARTIST, version)
+    assert latest != version
+    assert [(op["op"], op["id"]) for op in ops] == [
+        ("added", str(c["_id"])),
+        ("moved", str(c["_id"])),
+        ("moved", str(a["_id"])),
+        ("moved", str(b["_id"])),
+        ("status_changed", str(b["_id"])),
+        ("removed", str(a["_id"])),
+    ], ops
+    assert ops[-2]["status"] == "rejected"
+    # Caught-up clients get an empty delta
+    assert snapshots.changes_since(ARTIST, latest) == (latest, [])
+
+
+def test_full_queue_when_a_delta_is_impossible():
+    snapshots = loaded(request("A", 1))
+    version, _ = snapshots.get_versioned(ARTIST)
+    # A state this queue never was in, or garbage, never matches
+    assert snapshots.changes_since(ARTIST, "0123456789abcdef") is None
+    assert snapshots.changes_since(ARTIST, "not-a-version") is None
+
+    # Too far behind: the change log no longer reaches back to the version
+    for position in range(settings.QUEUE_CHANGE_LOG_SIZE + 1):
+        snapshots.upsert(request(f"S{position}", position + 2))
+    assert snapshots.changes_since(ARTIST, version) is None
+
+    snapshots.invalidate(ARTIST)
+    assert snapshots.get_versioned(ARTIST) is None
+    assert snapshots.changes_since(ARTIST, version) is None
+
+
+def test_workers_agree_on_versions():
+    a, b, c = request("A", 1), request("B", 2), request("C", 3)
+    # One worker loaded A and B and then saw C added; the other loaded all three later
+    early = loaded(a, b)
+    client_version, _ = early.get_versioned(ARTIST)
+    early.upsert(dict(c))
+    late = loaded(c, b, a)
+    assert early.get_versioned(ARTIST)[0] == late.get_versioned(ARTIST)[0]
+
+    # Both apply the same move, one through the route and one from the change stream
+    early.set_positions(ARTIST, {str(c["_id"]): 1, str(a["_id"]): 2, str(b["_id"]): 3})
+    for moved in ({**c, "queue_position": 1}, {**a, "queue_position": 2}, {**b, "queue_position": 3}):
+        late.upsert(moved)
+    version, _ = early.get_versioned(ARTIST)
+    assert late.get_versioned(ARTIST)[0] == version
+    # A client that polled the first worker gets a delta from the second
+    assert late.changes_since(ARTIST, version) == (version, [])
+    # Even from a version the second worker only loaded into, not through a logged change
+    assert early.changes_since(ARTIST, client_version) is not None
+    assert late.changes_since(ARTIST, client_version) is None, "the second worker never held A and B alone"
+
+
+def test_tip_order():
+    early = request("early, no tip", 1, minutes=0)
+    big = request("big tip", 2, tip=20, minutes=1)
+    small = request("small tip", 3, tip=5, minutes=2)
+    late_big = request("later big tip", 4, tip=20, minutes=3)
+    snapshots = loaded(early, big, small, late_big, order=QueueOrder.TIPS)
+    version, queue = snapshots.get_versioned(ARTIST)
+    assert [r["song_title"] for r in queue] == ["big tip", "later big tip", "small tip", "early, no tip"]
+    assert [r["queue_position"] for r in queue] == [1, 2, 3, 4], "queue_position is the rank"
+    # One tip can shift every rank, so tip-ordered queues are never served as deltas
+    assert snapshots.changes_since(ARTIST, version) is None
+
+
+def test_changes_during_a_load_are_replayed():
+    a, b = request("A", 1), request("B", 2)
+    snapshots = QueueSnapshots()
+    snapshots.stream_healthy = True
+    snapshots.begin_load(ARTIST)
+    # The change stream sees B completed and C added while A and B are being read
+    c = request("C", 3)
+    snapshots._loading[ARTIST] += [("upsert", {**b, "status": "completed"}), ("upsert", c)]
+    snapshots.load(ARTIST, [a, b])
+    assert titles(snapshots) == ["A", "C"]
+
+
+def main():
+    tests = [
+        test_queue_order_and_writes,
+        test_deltas_since_a_version,
+        test_full_queue_when_a_delta_is_impossible,
+        test_workers_agree_on_versions,
+        test_tip_order,
+        test_changes_during_a_load_are_replayed,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
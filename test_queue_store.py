@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Queue store tests
+
+Runs the same queue operations against the MongoDB store and the Redis
+sorted-set store and checks that both keep dense 1..n positions, and that
+the Redis store writes its positions back to MongoDB. Uses a throwaway
+database on a local mongod (MONGODB_URL, default mongodb://localhost:27017)
+and fakeredis if it is installed, otherwise the Redis at REDIS_URL.
+
+    docker run -d -p 27017:27017 mongo:7
+    docker run -d -p 6379:6379 redis:7
+    python test_queue_store.py
+"""
+import asyncio
+import importlib.metadata
+import os
+import sys
+from datetime import datetime
+
+# Never touch a real database: everything goes into a dedicated one on a local mongod
+os.environ["DATABASE_NAME"] = "requestr_queue_store"
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=2000")
+
+from pymongo.errors import ExecutionTimeout, PyMongoError
+
+from app.database import connect_to_mongo, close_mongo_connection, ensure_indexes, get_database
+from app.models.artist import Artist
+from app.models.request import RequestUpdate
+from app.routers.requests import update_request
+from app.services import queue_store
+from app.services.queue_store import MongoQueueStore, RedisQueueStore
+
+ARTIST = "store_artist"
+
+
+def redis_client():
+    try:
+        import fakeredis
+        return fakeredis.FakeRedis(decode_responses=True)
+    except ImportError:
+        import redis
+        client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/15"), decode_responses=True)
+        client.ping()
+        client.flushdb()
+        return client
+
+
+def add_requests(db, store, titles):
+    ids = {}
+    for title in titles:
+        position = store.next_position(ARTIST)
+        result = db.requests.insert_one({
+            "artist_username": ARTIST,
+            "song_title": title,
+            "song_artist": "Oasis",
+            "requester_name": "Sam",
+            "status": "pending",
+            "queue_position": position,
+            "created_at": datetime.utcnow(),
+        })
+        store.add(ARTIST, str(result.inserted_id), position)
+        ids[title] = str(result.inserted_id)
+    return ids
+
+
+def queue(db, store):
+    """Titles in queue order, using the store's live positions where it has them"""
+    requests = list(db.requests.find({"artist_username": ARTIST, "status": "pending"}))
+    positions = store.positions(ARTIST) or {}
+    for request in requests:
+        request["queue_position"] = positions.get(str(request["_id"]), request["queue_position"])
+    requests.sort(key=lambda r: r["queue_position"])
+    assert [r["queue_position"] for r in requests] == list(range(1, len(requests) + 1)), "positions are not dense"
+    return [r["song_title"] for r in requests]
+
+
+def check(name, actual, expected):
+    if actual != expected:
+        raise AssertionError(f"{name}: expected {expected}, got {actual}")
+    print(f"✅ {name}")
+
+
+def run_operations(db, store):
+    db.requests.delete_many({})
+    ids = add_requests(db, store, ["A", "B", "C", "D", "E"])
+    check("append", queue(db, store), ["A", "B", "C", "D", "E"])
+
+    # Reorders send the new position of every request, as the reorder endpoint does
+    store.move(ARTIST, {ids[title]: position for position, title in enumerate("EABCD", 1)})
+    check("move to front", queue(db, store), ["E", "A", "B", "C", "D"])
+
+    store.move(ARTIST, {ids[title]: position for position, title in enumerate("ABCDE", 1)})
+    check("move to back", queue(db, store), ["A", "B", "C", "D", "E"])
+
+    db.requests.update_one({"_id": db.requests.find_one({"song_title": "B"})["_id"]}, {"$set": {"status": "completed"}})
+    store.remove(ARTIST, ids["B"], 2)
+    check("remove", queue(db, store), ["A", "C", "D", "E"])
+
+    db.requests.update_many({"song_title": {"$in": ["A", "D"]}}, {"$set": {"status": "rejected"}})
+    store.remove_many(ARTIST, [ids["A"], ids["D"]])
+    check("remove many", queue(db, store), ["C", "E"])
+
+    completed = store.complete_head(ARTIST)
+    check("complete head", (completed["song_title"], completed["status"]), ("C", "completed"))
+    check("first after complete", store.first(ARTIST)["song_title"], "E")
+
+    add_requests(db, store, ["F"])
+    check("append after complete", queue(db, store), ["E", "F"])
+
+
+def run_redis_failures(db, store):
+    """The Redis store must not lose a request when MongoDB fails, and must keep order under many moves"""
+    db.requests.delete_many({})
+    store.redis.flushdb()
+    ids = add_requests(db, store, ["A", "B", "C"])
+
+    class FailingDatabase:
+        class requests:
+            @staticmethod
+            def find_one_and_update(*args, **kwargs):
+                raise ExecutionTimeout("operation exceeded time limit")
+
+    queue_store.get_database = lambda: FailingDatabase
+    try:
+        store.complete_head(ARTIST)
+        raise AssertionError("complete head: MongoDB failure was swallowed")
+    except ExecutionTimeout:
+        pass
+    finally:
+        queue_store.get_database = get_database
+    check("failed complete keeps the head queued", queue(db, store), ["A", "B", "C"])
+
+    # Repeatedly moving into the same gap halves it until the scores are respaced
+    order = ["A", "B", "C"]
+    for _ in range(60):
+        order = [order[0], order[2], order[1]]
+        store.move(ARTIST, {ids[title]: position for position, title in enumerate(order, 1)})
+    check("many moves into one gap", queue(db, store), order)
+
+
+def run_status_updates(db, store):
+    """PUT /requests/{id} takes requests out of the queue and puts them back through the store"""
+    db.requests.delete_many({})
+    if isinstance(store, RedisQueueStore):
+        store.redis.flushdb()
+    queue_store._queue_store = store
+    artist = Artist(username=ARTIST, display_name="Band")
+
+    def put(title, **fields):
+        return asyncio.run(update_request(ids[title], RequestUpdate(**fields), current_artist=artist))
+
+    ids = add_requests(db, store, ["A", "B", "C", "D"])
+    put("B", status="completed")
+    check("completing closes the gap", queue(db, store), ["A", "C", "D"])
+
+    put("B", queue_position=1)
+    check("position of a closed request is only recorded", queue(db, store), ["A", "C", "D"])
+    check("recorded position", db.requests.find_one({"song_title": "B"})["queue_position"], 1)
+
+    check("back to pending joins the end", put("B", status="pending").queue_position, 4)
+    check("queue after reopening", queue(db, store), ["A", "C", "D", "B"])
+
+    put("C", status="rejected")
+    check("reopened at a position", put("C", status="pending", queue_position=1).queue_position, 1)
+
+
+def main():
+    connect_to_mongo()
+    db = get_database()
+    try:
+        db.command("ping")
+    except PyMongoError as e:
+        print(f"⚠️  No MongoDB reachable, skipping queue store tests: {e}")
+        return 0
+    try:
+        client = redis_client()
+        # Results hold for this client version; requirements.txt pins the one they were run with
+        print(f"redis-py {importlib.metadata.version('redis')}")
+    except Exception as e:
+        print(f"⚠️  No Redis reachable, skipping queue store tests: {e}")
+        return 0
+
+    db.client.drop_database(db.name)
+    failed = 0
+    try:
+        ensure_indexes()
+        for name, store in [("mongo", MongoQueueStore()), ("redis", RedisQueueStore(client=client))]:
+            print(f"\n{name} store")
+            try:
+                run_operations(db, store)
+                run_status_updates(db, store)
+                if isinstance(store, RedisQueueStore):
+                    run_redis_failures(db, store)
+                    # Positions reach MongoDB asynchronously; flush and compare
+                    store.flush()
+                    stored = [
+                        r["song_title"]
+                        for r in db.requests.find({"artist_username": ARTIST, "status": "pending"}).sort("queue_position", 1)
+                    ]
+                    check("persisted positions", stored, queue(db, store))
+            except AssertionError as e:
+                failed += 1
+                print(f"❌ {e}")
+    finally:
+        db.client.drop_database(db.name)
+        close_mongo_connection()
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} queue store(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
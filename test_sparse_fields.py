@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Sparse fieldset and response compression tests
+
+Checks how a `fields` parameter is validated and turned into a MongoDB
+projection and a trimmed response, and that responses over
+GZIP_MINIMUM_SIZE are gzipped for clients that accept it while small
+ones are sent as is. Needs no database.
+
+    python test_sparse_fields.py
+"""
+import gzip
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.routers.requests import _parse_fields, _sparse_projection, _to_sparse_request
+
+
+def test_fields_are_validated():
+    assert _parse_fields(None) is None
+    assert _parse_fields("song_title, queue_position,song_title") == ["id", "song_title", "queue_position"]
+    assert _parse_fields("id") == ["id"]
+    try:
+        _parse_fields("song_title,password")
+    except HTTPException as e:
+        assert e.status_code == 400 and "password" in e.detail, e.detail
+    else:
+        raise AssertionError("unknown field was accepted")
+
+
+def test_projection_reads_only_what_is_needed():
+    assert _sparse_projection(["id", "song_title"]) == {"song_title": 1}
+    assert _sparse_projection(["id", "song_title"], "created_at") == {"song_title": 1, "created_at": 1}
+    # Track fields may live on the track document, so the join key is read too
+    assert _sparse_projection(["id", "album_image_url"]) == {"album_image_url": 1, "spotify_track_id": 1}
+
+
+def test_sparse_request_serialization():
+    request_id = ObjectId()
+    doc = {
+        "_id": request_id,
+        "song_title": "Wonderwall",
+        "requester_name": "Sam",
+        "created_at": datetime(2024, 5, 1, 21, 30),
+    }
+    sparse = _to_sparse_request(doc, ["id", "song_title", "created_at", "message"])
+    assert sparse == {
+        "id": str(request_id),
+        "song_title": "Wonderwall",
+        "created_at": "2024-05-01T21:30:00",
+        "message": None,
+    }, sparse
+
+
+def test_large_responses_are_gzipped():
+    app = FastAPI()
+    app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE, compresslevel=settings.GZIP_COMPRESSLEVEL)
+
+    @app.get("/queue")
+    async def queue(size: int):
+        return [{"id": str(i), "song_title": "Wonderwall", "song_artist": "Oasis"} for i in range(size)]
+
+    client = TestClient(app)
+    large = client.get("/queue?size=100", headers={"Accept-Encoding": "gzip"})
+    assert large.headers.get("content-encoding") == "gzip"
+    assert len(large.json()) == 100
+    small = client.get("/queue?size=1", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers, "small bodies are not worth compressing"
+    plain = client.get("/queue?size=100", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert len(gzip.compress(plain.content)) < len(plain.content) / 4
+
+
+def main():
+    tests = [
+        test_fields_are_validated,
+        test_projection_reads_only_what_is_needed,
+        test_sparse_request_serialization,
+        test_large_responses_are_gzipped,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
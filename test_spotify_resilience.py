@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test script for Spotify rate-limit and outage handling
+
+Runs SpotifyService against a local stub of the Spotify Web API that can
+return 429s with Retry-After or respond slowly. No credentials or network
+access are needed.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import spotipy
+from fastapi import HTTPException
+
+from app.services.spotify import SpotifyService
+
+
+class StubSpotify(BaseHTTPRequestHandler):
+    mode = "ok"
+    retry_after = 2
+    delay = 0.0
+    hits = 0
+
+    def do_GET(self):
+        StubSpotify.hits += 1
+        if StubSpotify.mode == "429":
+            self._reply(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                        {"Retry-After": str(StubSpotify.retry_after)})
+            return
+        if StubSpotify.mode == "slow":
+            time.sleep(StubSpotify.delay)
+        track = {
+            "id": "track1",
+            "name": "Wonderwall",
+            "artists": [{"name": "Oasis"}],
+            "album": {"name": "Morning Glory", "images": [], "release_date": "1995"},
+            "preview_url": None,
+            "external_urls": {"spotify": "https://open.spotify.com/track/track1"},
+            "duration_ms": 258000,
+            "popularity": 80,
+        }
+        if self.path.startswith("/v1/search"):
+            self._reply(200, {"tracks": {"items": [track]}})
+        else:
+            self._reply(200, track)
+
+    def _reply(self, code, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_service(server):
+    client = spotipy.Spotify(auth="stub-token", requests_session=requests.Session(), requests_timeout=0.3)
+    client.prefix = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    return SpotifyService(client=client)
+
+
+def reset_stub(mode="ok"):
+    StubSpotify.mode = mode
+    StubSpotify.hits = 0
+
+
+def test_retry_after_opens_shared_backoff():
+    server = start_stub()
+    service = make_service(server)
+    reset_stub("429")
+
+    try:
+        service.search_tracks("wonderwall")
+        assert False, "expected a 503"
+    except HTTPException as e:
+        assert e.status_code == 503
+        assert int(e.headers["Retry-After"]) >= 1
+
+    # Other queries fail fast without calling Spotify during the window
+    try:
+        service.search_tracks("something else")
+        assert False, "expected a 503"
+    except HTTPException as e:
+        assert e.status_code == 503
+    assert StubSpotify.hits == 1
+    server.shutdown()
+
+
+def test_stale_results_served_while_throttled():
+    server = start_stub()
+    service = make_service(server)
+    reset_stub("ok")
+
+    fresh = service.search_tracks("wonderwall")
+    assert fresh and "stale" not in fresh[0]
+
+    # Age the cache, then throttle Spotify
+    service.search_cache.ttl = 0
+    reset_stub("429")
+    stale = service.search_tracks("wonderwall")
+    assert stale[0]["stale"] is True
+    assert stale[0]["name"] == fresh[0]["name"]
+    server.shutdown()
+
+
+def test_circuit_opens_after_slow_responses():
+    server = start_stub()
+    service = make_service(server)
+    reset_stub("slow")
+    StubSpotify.delay = 1.0
+
+    for i in range(service.breaker.failure_threshold):
+        try:
+            service.search_tracks(f"slow query {i}")
+        except HTTPException as e:
+            assert e.status_code == 503
+    assert service.breaker.state == "open"
+
+    hits = StubSpotify.hits
+    start = time.perf_counter()
+    try:
+        service.search_tracks("another query")
+        assert False, "expected a 503"
+    except HTTPException as e:
+        assert e.status_code == 503
+    assert time.perf_counter() - start < 0.1, "open circuit should fail fast"
+    assert StubSpotify.hits == hits
+    server.shutdown()
+
+
+def test_half_open_trial_closes_circuit():
+    server = start_stub()
+    service = make_service(server)
+    service.breaker.reset_seconds = 0.2
+    reset_stub("slow")
+    StubSpotify.delay = 1.0
+
+    for i in range(service.breaker.failure_threshold):
+        try:
+            service.search_tracks(f"slow query {i}")
+        except HTTPException:
+            pass
+
+    time.sleep(0.3)
+    reset_stub("ok")
+    assert service.search_tracks("recovered")
+    assert service.breaker.state == "closed"
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    tests = [
+        test_retry_after_opens_shared_backoff,
+        test_stale_results_served_while_throttled,
+        test_circuit_opens_after_slow_responses,
+        test_half_open_trial_closes_circuit,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "="*50)
+    print("Test completed!" if not failed else f"{failed} test(s) failed")
+    print("="*50)